@@ -1,5 +1,13 @@
 from fastapi import FastAPI
-from .routers import users, auth, orders
+from .routers import users, auth, orders, metrics
+from .middleware.sql_metrics import sql_metrics_middleware
+from .utils.security import shutdown_password_pool
+from .utils.thumbnails import shutdown_thumbnail_pool
+from .utils.invalidation import start_invalidation_listener, stop_invalidation_listener
+from .utils.order_counts import start_order_counts_reconciler, stop_order_counts_reconciler
+from .utils.order_events import stop_order_events
+from .utils.delta_sync import start_sync_tombstones_purger, stop_sync_tombstones_purger
+from .utils.workload import start_workload_tracking
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -15,12 +23,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], 
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Query-Count", "ETag"],
 )
 
+# Instrumentação de SQL por requisição (Server-Timing e alerta de N+1)
+app.middleware("http")(sql_metrics_middleware)
+
 # Rotas
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(orders.router)
+app.include_router(metrics.router)
+
+@app.on_event("startup")
+def startup():
+    # Consome eventos de invalidação publicados pelos demais workers
+    start_invalidation_listener()
+    start_order_counts_reconciler()
+    start_sync_tombstones_purger()
+    start_workload_tracking()
+
+@app.on_event("shutdown")
+def shutdown():
+    stop_invalidation_listener()
+    stop_order_counts_reconciler()
+    stop_sync_tombstones_purger()
+    stop_order_events()
+    shutdown_password_pool()
+    shutdown_thumbnail_pool()
 
 @app.get("/")
 def root():
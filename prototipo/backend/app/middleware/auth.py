@@ -1,31 +1,37 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from ..models.database import SessionLocal
+from ..models.database import get_db
 from ..models.auth import users_table
-from ..utils.security import verify_token, is_token_revoked, get_user_by_username
+from ..utils.security import (
+    verify_token,
+    is_token_revoked,
+    get_user_by_username,
+    get_cached_user,
+    cache_authenticated_user
+)
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_db():
-    """Dependência para obter sessão do banco"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Dependência para obter usuário atual autenticado"""
-    token = credentials.credentials
+    return await authenticate_token(credentials.credentials, db)
+
+async def authenticate_token(token: str, db: AsyncSession):
+    """Valida o token de acesso e retorna o usuário (HTTPException 401 se inválido)"""
+    # Token validado recentemente: dispensa as consultas ao banco
+    cached_user = get_cached_user(token)
+    if cached_user is not None:
+        return cached_user
     
     # Verificar se token foi revogado
-    if is_token_revoked(db, token):
+    if await db.run_sync(is_token_revoked, token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido ou expirado",
@@ -50,7 +56,7 @@ def get_current_user(
         )
     
     # Buscar usuário
-    user = get_user_by_username(db, username)
+    user = await db.run_sync(get_user_by_username, username)
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -58,9 +64,35 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    cache_authenticated_user(token, payload, user)
+    return user
+
+async def get_current_stream_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    access_token: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Dependência para fluxos (SSE): aceita o token no cabeçalho Bearer ou em ?access_token=
+    
+    O EventSource do navegador não envia cabeçalhos. O token na URL pode aparecer em logs de
+    acesso e proxies; clientes que conseguem enviar o cabeçalho devem preferi-lo.
+    """
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Não autenticado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = await authenticate_token(token, db)
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Usuário inativo"
+        )
     return user
 
-def get_current_active_user(current_user = Depends(get_current_user)):
+async def get_current_active_user(current_user = Depends(get_current_user)):
     """Dependência para obter usuário ativo atual"""
     if not current_user.is_active:
         raise HTTPException(
@@ -69,7 +101,7 @@ def get_current_active_user(current_user = Depends(get_current_user)):
         )
     return current_user
 
-def require_admin(current_user = Depends(get_current_active_user)):
+async def require_admin(current_user = Depends(get_current_active_user)):
     """Dependência para verificar se usuário é administrador"""
     if current_user.role != "administrador":
         raise HTTPException(
@@ -0,0 +1,46 @@
+import os
+import logging
+from fastapi import Request
+
+from ..models.database import start_request_query_stats
+
+logger = logging.getLogger(__name__)
+
+# Expõe as estatísticas SQL da requisição no cabeçalho Server-Timing
+SQL_TIMING_HEADER = os.getenv("SQL_TIMING_HEADER", "false").lower() in ("1", "true", "yes")
+# Quantas repetições do mesmo statement em uma requisição indicam um N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+# Tempo total de banco (ms) a partir do qual a requisição é registrada como lenta (0 desativa)
+SQL_SLOW_REQUEST_MS = float(os.getenv("SQL_SLOW_REQUEST_MS", "500"))
+# Tamanho máximo do texto de statement nos logs
+SQL_LOG_STATEMENT_CHARS = 300
+
+async def sql_metrics_middleware(request: Request, call_next):
+    """Coleta contagem e tempo dos statements SQL de cada requisição"""
+    stats = start_request_query_stats()
+    response = await call_next(request)
+    
+    slowest = (stats.slowest_statement or "")[:SQL_LOG_STATEMENT_CHARS]
+    for shape, repetitions in stats.shapes.items():
+        if repetitions > SQL_N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "Possível N+1 em %s %s: statement executado %d vezes: %s (mais lento: %.1fms %s)",
+                request.method, request.url.path, repetitions, shape[:SQL_LOG_STATEMENT_CHARS],
+                stats.slowest_seconds * 1000, slowest
+            )
+    
+    if SQL_SLOW_REQUEST_MS > 0 and stats.total_seconds * 1000 >= SQL_SLOW_REQUEST_MS:
+        logger.warning(
+            "Requisição lenta no banco %s %s: %d queries em %.1fms; mais lenta %.1fms: %s",
+            request.method, request.url.path, stats.count, stats.total_seconds * 1000,
+            stats.slowest_seconds * 1000, slowest
+        )
+    
+    if SQL_TIMING_HEADER:
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.total_seconds * 1000:.2f};desc="{stats.count} queries", '
+            f'db-slowest;dur={stats.slowest_seconds * 1000:.2f}'
+        )
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+    
+    return response
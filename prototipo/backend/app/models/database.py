@@ -1,6 +1,14 @@
 import os
-from sqlalchemy import create_engine
+import re
+import time
+import threading
+import contextvars
+from collections import Counter
+from typing import Optional
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 
 DB_USER = os.getenv("DB_USER", "admin")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
@@ -9,6 +17,203 @@ DB_HOST = os.getenv("DB_HOST", "db-postgres")  # nome do serviço no docker-comp
 DB_PORT = os.getenv("DB_PORT", "5432")  # 5432 dentro do Docker, 5441 para conexão externa
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
+# Modo assíncrono: rotas usam AsyncSession sobre asyncpg em vez de Session síncrona no threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+# Pool de conexões (dimensionar considerando max_connections do Postgres e o número de réplicas/workers)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos aguardando uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos; -1 desativa
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sem limite
+
+class PoolStats:
+    """Contadores de uso do pool: checkouts, tempo de espera e timeouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, wait_seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "total_wait_seconds": round(self.total_wait_seconds, 6),
+                "avg_wait_seconds": round(self.total_wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 6)
+            }
+
+# Contadores por engine: a síncrona continua em uso no modo assíncrono (exportação, tarefas em segundo plano)
+pool_stats = {"sync": PoolStats(), "async": PoolStats()}
+
+class _PoolInstrumentation:
+    """Mede o tempo de espera por conexão e conta timeouts de checkout"""
+    stats_key = "sync"
+
+    def _do_get(self):
+        stats = pool_stats[self.stats_key]
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            stats.record_timeout()
+            raise
+        stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+class InstrumentedQueuePool(_PoolInstrumentation, QueuePool):
+    stats_key = "sync"
+
+class InstrumentedAsyncQueuePool(_PoolInstrumentation, AsyncAdaptedQueuePool):
+    stats_key = "async"
+
+connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS > 0:
+    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=connect_args
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        async_connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=async_connect_args
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+class ThreadedSession:
+    """Interface de AsyncSession sobre uma Session síncrona, executando cada chamada no threadpool"""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def execute(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.execute, statement, params)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """Executa fn(session, *args) com a Session síncrona, como AsyncSession.run_sync"""
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+# Instrumentação de SQL por requisição (contagem, tempo total, statement mais lento, N+1)
+class RequestQueryStats:
+    """Estatísticas dos statements SQL executados durante uma requisição"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        shape = re.sub(r"\s+", " ", statement).strip()
+        self.count += 1
+        self.total_seconds += seconds
+        self.shapes[shape] += 1
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = shape
+
+_request_query_stats: contextvars.ContextVar = contextvars.ContextVar("request_query_stats", default=None)
+
+def start_request_query_stats() -> RequestQueryStats:
+    """Inicia a coleta de estatísticas SQL para a requisição atual"""
+    stats = RequestQueryStats()
+    _request_query_stats.set(stats)
+    return stats
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+    stats = _request_query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+for _instrumented_engine in filter(None, [engine, async_engine.sync_engine if async_engine else None]):
+    event.listen(_instrumented_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_instrumented_engine, "after_cursor_execute", _after_cursor_execute)
+
+async def get_db():
+    """Dependência para obter sessão do banco (uma por requisição, compartilhada entre autenticação e rotas)"""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+def _pool_metrics(pool, stats: PoolStats) -> dict:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "pool_timeout_seconds": DB_POOL_TIMEOUT,
+        **stats.snapshot()
+    }
+
+def get_pool_metrics() -> dict:
+    """Estado atual dos pools de conexões e contadores acumulados, por engine
+    
+    "sync" sempre aparece: mesmo com DB_ASYNC=true a exportação e as tarefas em
+    segundo plano usam a engine síncrona. "async" apenas com DB_ASYNC=true.
+    """
+    metrics = {"sync": _pool_metrics(engine.pool, pool_stats["sync"])}
+    if async_engine is not None:
+        metrics["async"] = _pool_metrics(async_engine.pool, pool_stats["async"])
+    return metrics
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # Modelos para Clientes
@@ -77,6 +77,24 @@ class ServiceOrderRead(ServiceOrderBase):
     class Config:
         from_attributes = True
 
+class ServiceOrderPage(BaseModel):
+    items: List[ServiceOrderRead]
+    next_cursor: Optional[str] = None  # None quando não há mais páginas
+
+class DashboardCount(BaseModel):
+    id: int
+    name: Optional[str] = None
+    count: int
+
+class OrderDashboard(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_technician: List[DashboardCount]
+    by_client: List[DashboardCount]
+
+class AutoAssignRequest(BaseModel):
+    order_ids: Optional[List[int]] = None  # None: ordens abertas sem técnico mais antigas
+
 
 
 
@@ -147,6 +165,34 @@ class PhotoRead(PhotoBase):
     id: int
     service_order_id: int
     uploaded_at: Optional[datetime] = None
+    
+    # Versões reduzidas (geradas em segundo plano; servem o original enquanto não existem)
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+
+
+
+
+
+# Modelos para sincronização incremental
+class SyncOrder(ServiceOrderRead):
+    row_version: int  # para If-Match nas escritas feitas offline
+
+class SyncTombstone(BaseModel):
+    entity: str  # 'service_order', 'checklist_response' ou 'photo'
+    id: int
+    service_order_id: int
+    reason: str  # 'deleted' ou 'reassigned' (a OS saiu da carteira do técnico)
+    deleted_at: datetime
+
+class OrderSync(BaseModel):
+    sync_token: str  # enviar como since na próxima sincronização
+    reset: bool = False  # True: estado completo, o cliente deve descartar a cópia local
+    orders: List[SyncOrder]
+    checklist_responses: List[ChecklistResponseRead]
+    photos: List[PhotoRead]
+    tombstones: List[SyncTombstone]  # aplicar antes das alterações
@@ -1,5 +1,6 @@
-from sqlalchemy import Table, Column, Integer, String, Boolean, Text, TIMESTAMP, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Table, Column, Integer, BigInteger, String, Boolean, Text, TIMESTAMP, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from .auth import metadata
 
 # Tabela de clientes
@@ -39,10 +40,25 @@ service_orders_table = Table(
     Column("description", Text),
     Column("activities_description", Text),  # Descrição das atividades realizadas
     Column("status", String(20), default="open"),
-    Column("created_at", TIMESTAMP, default=func.current_timestamp()),
-    Column("updated_at", TIMESTAMP, default=func.current_timestamp())
+    Column("created_at", TIMESTAMP, nullable=False, default=func.current_timestamp()),  # chave do cursor (initdb/04)
+    Column("updated_at", TIMESTAMP, default=func.current_timestamp()),
+    Column("row_version", Integer, nullable=False, default=1)  # incrementada por trigger a cada UPDATE
 )
 
+# Contadores de ordens por status, técnico e cliente (mantidos por trigger, initdb/09)
+service_order_counts_table = Table(
+    "service_order_counts",
+    metadata,
+    Column("dimension", String(20), primary_key=True),  # 'status', 'user' ou 'client'
+    Column("dimension_key", Text, primary_key=True),
+    Column("order_count", BigInteger, nullable=False)
+)
+
+# Vetor de busca textual de service_orders (coluna gerada em initdb/08_service_orders_search.sql).
+# Fica fora da Table para não ser lido nas listagens, que selecionam todas as colunas.
+SEARCH_CONFIG = literal_column("'portuguese'::regconfig")  # constante (e não parâmetro) para o planner
+service_orders_search_vector = literal_column("service_orders.search_vector", type_=TSVECTOR)
+
 # Tabela de checklists
 checklists_table = Table(
     "checklists",
@@ -68,7 +84,9 @@ os_checklist_responses_table = Table(
     Column("service_order_id", Integer, ForeignKey("service_orders.id"), nullable=False),
     Column("checklist_item_id", Integer, ForeignKey("checklist_items.id"), nullable=False),
     Column("is_checked", Boolean, nullable=False),
-    Column("responded_at", TIMESTAMP, default=func.current_timestamp())
+    Column("responded_at", TIMESTAMP, default=func.current_timestamp()),
+    Column("updated_at", TIMESTAMP, default=func.current_timestamp()),  # mantido por trigger (initdb/12)
+    UniqueConstraint("service_order_id", "checklist_item_id", name="uq_os_checklist_responses_order_item")
 )
 
 # Tabela de fotos das OS
@@ -78,5 +96,19 @@ os_photos_table = Table(
     Column("id", Integer, primary_key=True),
     Column("service_order_id", Integer, ForeignKey("service_orders.id"), nullable=False),
     Column("photo_url", Text, nullable=False),
-    Column("uploaded_at", TIMESTAMP, default=func.current_timestamp())
+    Column("uploaded_at", TIMESTAMP, default=func.current_timestamp()),
+    Column("updated_at", TIMESTAMP, default=func.current_timestamp())  # mantido por trigger (initdb/12)
+)
+
+# Registro de exclusões para a sincronização incremental (preenchido por trigger, initdb/12)
+sync_tombstones_table = Table(
+    "sync_tombstones",
+    metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("entity", String(30), nullable=False),  # 'service_order', 'checklist_response' ou 'photo'
+    Column("entity_id", Integer, nullable=False),
+    Column("service_order_id", Integer, nullable=False),
+    Column("user_id", Integer),  # técnico da OS no momento da exclusão
+    Column("reason", String(20), nullable=False, default="deleted"),  # 'deleted' ou 'reassigned'
+    Column("deleted_at", TIMESTAMP, nullable=False)
 )
@@ -1,20 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
 
-from ..models.database import SessionLocal
+from ..models.database import get_db
 from ..models.auth import users_table
 from ..models.auth_models import UserLogin, Token, UserRead
 from ..utils.security import (
-    authenticate_user, 
+    authenticate_user_async,
     create_access_token, 
     get_user_by_username,
     create_token_record,
     revoke_token,
     verify_token,
     is_token_revoked,
+    PasswordHasherBusy,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -25,21 +26,20 @@ router = APIRouter(
 
 security = HTTPBearer()
 
-def get_db():
-    """Dependência para obter sessão do banco"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Endpoint para fazer login"""
-    # Autenticar usuário
-    user = authenticate_user(db, user_credentials.username, user_credentials.password)
+    # Autenticar usuário (bcrypt roda no pool de processos, fora do event loop)
+    try:
+        user = await authenticate_user_async(db, user_credentials.username, user_credentials.password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado. Tente novamente em instantes.",
+            headers={"Retry-After": "1"},
+        )
     
     if not user:
         raise HTTPException(
@@ -56,7 +56,7 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     
     # Salvar token no banco
     expires_at = datetime.utcnow() + access_token_expires
-    create_token_record(db, user.id, access_token, expires_at)
+    await db.run_sync(create_token_record, user.id, access_token, expires_at)
     
     # Preparar dados do usuário para resposta
     user_data = {
@@ -79,30 +79,30 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/logout")
-def logout(
+async def logout(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint para fazer logout"""
     token = credentials.credentials
     
     # Revogar token no banco
-    revoke_token(db, token)
+    await db.run_sync(revoke_token, token)
     
     return {"message": "Logout realizado com sucesso"}
 
 
 
 @router.get("/me", response_model=UserRead)
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint para obter dados do usuário atual"""
     token = credentials.credentials
     
     # Verificar se token foi revogado
-    if is_token_revoked(db, token):
+    if await db.run_sync(is_token_revoked, token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido ou expirado",
@@ -127,7 +127,7 @@ def get_current_user(
         )
     
     # Buscar usuário
-    user = get_user_by_username(db, username)
+    user = await db.run_sync(get_user_by_username, username)
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -148,15 +148,15 @@ def get_current_user(
 
 
 @router.post("/verify-token")
-def verify_token_endpoint(
+async def verify_token_endpoint(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Endpoint para verificar se token é válido"""
     token = credentials.credentials
     
     # Verificar se token foi revogado
-    if is_token_revoked(db, token):
+    if await db.run_sync(is_token_revoked, token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido ou expirado"
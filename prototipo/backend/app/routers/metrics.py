@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+
+from ..models.database import get_pool_metrics
+from ..middleware.auth import require_admin
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"]
+)
+
+@router.get("/db-pool")
+def db_pool_metrics(current_user = Depends(require_admin)):
+    """Uso do pool de conexões com o banco (requer privilégios de administrador)"""
+    return get_pool_metrics()
@@ -1,23 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Header, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, tuple_, literal_column, type_coerce, and_, or_, cast, values, column, Integer, Float, Text
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by, insert as pg_insert
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import uuid
+import io
+import re
+import asyncio
+import csv
+import json
 import shutil
+import logging
+import mimetypes
 
-from ..models.database import SessionLocal
+from ..models.database import get_db, engine
 from ..models.orders import (
     service_orders_table, clients_table, equipments_table, 
     checklists_table, checklist_items_table,
-    os_checklist_responses_table, os_photos_table
+    os_checklist_responses_table, os_photos_table, service_order_counts_table, sync_tombstones_table,
+    service_orders_search_vector, SEARCH_CONFIG
 )
 from ..models.auth import users_table
 from ..models.order_models import (
     ServiceOrderCreate, 
     ServiceOrderRead, 
     ServiceOrderUpdate,
+    ServiceOrderPage,
+    OrderDashboard,
+    AutoAssignRequest,
+    OrderSync,
     ClientCreate, 
     ClientRead, 
     EquipmentCreate, 
@@ -30,20 +44,264 @@ from ..models.order_models import (
     PhotoCreate,
     PhotoRead
 )
-from ..middleware.auth import get_current_active_user
+from ..middleware.auth import get_current_active_user, get_current_stream_user
+from ..utils.pagination import (
+    encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor, encode_sync_token, decode_sync_token
+)
+from ..utils.reference_cache import reference_cache, reference_response
+from ..utils.invalidation import invalidation_notify
+from ..utils.order_events import order_event_broker, format_sse, ORDER_EVENTS_HEARTBEAT_SECONDS
+from ..utils.delta_sync import SYNC_OVERLAP_SECONDS, SYNC_TOMBSTONE_RETENTION_DAYS
+from ..utils.workload import (
+    technician_workload, select_technician_loads, plan_assignments, OPEN_ORDER_STATUSES, TECHNICIAN_ROLE
+)
+from ..utils.storage import (
+    UPLOAD_DIR, UPLOAD_URL_PREFIX, UPLOAD_ACCEL_REDIRECT_PREFIX, UploadTooLarge,
+    receive_upload, store_upload, discard_upload, delete_stored_file,
+    resolve_upload_path, stored_path_from_url, is_content_addressed, accel_redirect_path
+)
+from ..utils.http_cache import file_cache_headers, is_not_modified, etag_matches
+from ..utils.thumbnails import rendition_urls, original_filename, schedule_renditions
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/orders",
     tags=["service_orders"]
 )
 
-def get_db():
-    """Dependência para obter sessão do banco"""
-    db = SessionLocal()
+
+
+
+
+# ===== CONSULTAS AUXILIARES =====
+
+# Campos expostos de cada relacionamento da ordem de serviço
+CLIENT_FIELDS = ("id", "name", "email", "phone", "address", "created_at")
+EQUIPMENT_FIELDS = ("id", "type", "brand", "model", "serial_number", "client_id", "created_at")
+USER_FIELDS = ("id", "username", "name", "email", "role", "is_active", "created_at")
+CHECKLIST_ITEM_FIELDS = ("id", "description", "checklist_id")
+
+def _prefixed_columns(table, prefix: str, fields: tuple):
+    """Rotula colunas de uma tabela relacionada como <prefixo>__<campo>"""
+    return [table.c[field].label(f"{prefix}__{field}") for field in fields]
+
+def _join_order_relations(orders):
+    return (
+        orders
+        .outerjoin(clients_table, clients_table.c.id == orders.c.client_id)
+        .outerjoin(equipments_table, equipments_table.c.id == orders.c.equipment_id)
+        .outerjoin(users_table, users_table.c.id == orders.c.user_id)
+    )
+
+def select_orders_with_relations(orders=service_orders_table):
+    """Monta SELECT das ordens com cliente, equipamento e técnico via LEFT JOIN
+    
+    orders pode ser a própria tabela ou uma CTE com as mesmas colunas (ex.: UPDATE ... RETURNING).
+    """
+    return select(
+        orders,
+        *_prefixed_columns(clients_table, "client", CLIENT_FIELDS),
+        *_prefixed_columns(equipments_table, "equipment", EQUIPMENT_FIELDS),
+        *_prefixed_columns(users_table, "user", USER_FIELDS)
+    ).select_from(_join_order_relations(orders))
+
+def related_digest():
+    """md5 dos campos expostos de cliente, equipamento e técnico (requer os JOINs de _join_order_relations)
+    
+    Compõe a ETag da ordem: renomear o técnico ou o cliente muda a representação sem
+    alterar row_version.
+    """
+    return func.md5(cast(func.json_build_array(
+        *(clients_table.c[field] for field in CLIENT_FIELDS),
+        *(equipments_table.c[field] for field in EQUIPMENT_FIELDS),
+        *(users_table.c[field] for field in USER_FIELDS)
+    ), Text)).label("related_digest")
+
+def _related_from_row(row, prefix: str, fields: tuple) -> Optional[dict]:
+    """Extrai um relacionamento rotulado da linha (None se o JOIN não encontrou)"""
+    data = row._mapping
+    if data[f"{prefix}__id"] is None:
+        return None
+    return {field: data[f"{prefix}__{field}"] for field in fields}
+
+def order_from_row(row) -> dict:
+    """Converte uma linha de select_orders_with_relations no formato ServiceOrderRead"""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "description": row.description,
+        "activities_description": row.activities_description,
+        "status": row.status,
+        "client_id": row.client_id,
+        "equipment_id": row.equipment_id,
+        "user_id": row.user_id,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "client": _related_from_row(row, "client", CLIENT_FIELDS),
+        "equipment": _related_from_row(row, "equipment", EQUIPMENT_FIELDS),
+        "user": _related_from_row(row, "user", USER_FIELDS)
+    }
+
+
+
+
+
+def photo_to_dict(photo) -> dict:
+    """Converte uma foto (linha ou objeto JSON) no formato PhotoRead, com as URLs das miniaturas"""
+    data = photo if isinstance(photo, dict) else photo._mapping
+    return {
+        "id": data["id"],
+        "service_order_id": data["service_order_id"],
+        "photo_url": data["photo_url"],
+        "uploaded_at": data["uploaded_at"],
+        **rendition_urls(data["photo_url"])
+    }
+
+def select_checklist_responses():
+    """Monta SELECT das respostas de checklist com o item respondido via LEFT JOIN"""
+    return select(
+        os_checklist_responses_table,
+        *_prefixed_columns(checklist_items_table, "item", CHECKLIST_ITEM_FIELDS)
+    ).select_from(
+        os_checklist_responses_table.outerjoin(
+            checklist_items_table,
+            checklist_items_table.c.id == os_checklist_responses_table.c.checklist_item_id
+        )
+    )
+
+def checklist_response_from_row(response) -> dict:
+    """Converte uma linha de select_checklist_responses no formato ChecklistResponseRead"""
+    return {
+        "id": response.id,
+        "service_order_id": response.service_order_id,
+        "checklist_item_id": response.checklist_item_id,
+        "is_checked": response.is_checked,
+        "responded_at": response.responded_at,
+        "checklist_item": _related_from_row(response, "item", CHECKLIST_ITEM_FIELDS)
+    }
+
+def select_order_photos_json(orders=service_orders_table):
+    """Subconsulta correlacionada com as fotos da ordem agregadas em JSON (mais recentes primeiro)"""
+    photo = os_photos_table.table_valued()  # linha inteira de os_photos como registro
+    return select(
+        func.coalesce(
+            func.json_agg(aggregate_order_by(photo, os_photos_table.c.uploaded_at.desc())),
+            literal_column("'[]'::json")
+        )
+    ).where(
+        os_photos_table.c.service_order_id == orders.c.id
+    ).scalar_subquery()
+
+def _order_detail_from_row(row) -> dict:
+    order = order_from_row(row)
+    order["photos"] = [photo_to_dict(photo) for photo in row.photos]
+    # Não fazem parte de ServiceOrderRead
+    order["row_version"] = row.row_version
+    order["etag"] = order_etag(row.id, row.row_version, row.related_digest)
+    return order
+
+async def load_order_detail(db: AsyncSession, order_id: int) -> Optional[dict]:
+    """Carrega a ordem com cliente, equipamento, técnico e fotos em uma única consulta"""
+    query = select_orders_with_relations().add_columns(
+        type_coerce(select_order_photos_json(), JSON).label("photos"),
+        related_digest()
+    ).where(service_orders_table.c.id == order_id)
+    
+    row = (await db.execute(query)).first()
+    if not row:
+        return None
+    return _order_detail_from_row(row)
+
+async def update_order_detail(
+    db: AsyncSession, order_id: int, values: dict, expected_versions: Optional[List[int]] = None
+) -> Optional[dict]:
+    """Atualiza a ordem e devolve o detalhe atualizado em um único statement
+    
+    UPDATE ... RETURNING em CTE, lido com relacionamentos e fotos. Com expected_versions
+    o UPDATE só ocorre se a versão da linha ainda for uma das informadas (If-Match).
+    Retorna None se nenhuma linha foi atualizada.
+    """
+    stmt = service_orders_table.update().where(service_orders_table.c.id == order_id)
+    if expected_versions is not None:
+        stmt = stmt.where(service_orders_table.c.row_version.in_(expected_versions))
+    updated = stmt.values(**values).returning(*service_orders_table.c).cte("updated_order")
+    
+    query = select_orders_with_relations(updated).add_columns(
+        type_coerce(select_order_photos_json(updated), JSON).label("photos"),
+        related_digest()
+    )
+    row = (await db.execute(query)).first()
+    if not row:
+        return None
+    return _order_detail_from_row(row)
+
+ORDER_ETAG_PATTERN = re.compile(r'^"o(\d+)v(\d+)(?:-[0-9a-f]+)?"$')
+
+def order_etag(order_id: int, row_version: int, digest: str) -> str:
+    """ETag forte da ordem: versão da linha (inclui fotos) e resumo de cliente, equipamento e técnico"""
+    return f'"o{order_id}v{row_version}-{digest[:16]}"'
+
+def expected_order_versions(if_match: Optional[str], order_id: int) -> Optional[List[int]]:
+    """Versões aceitas por If-Match (None se ausente ou '*'); 412 se nenhuma ETag for desta ordem
+    
+    Aceita lista separada por vírgulas e ETags fracas (W/, ex.: após compressão em proxy).
+    Só a versão da linha é comparada: a escrita altera apenas a ordem, não os relacionamentos.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        match = ORDER_ETAG_PATTERN.match(tag)
+        if match and int(match.group(1)) == order_id:
+            versions.append(int(match.group(2)))
+    if not versions:
+        raise HTTPException(status_code=412, detail="A ordem de serviço foi alterada por outra pessoa")
+    return versions
+
+async def raise_order_write_failed(db: AsyncSession, order_id: int, expected_versions: Optional[List[int]]):
+    """UPDATE sem linhas afetadas: 412 se a ordem existe mas mudou de versão, senão 404"""
+    if expected_versions is not None:
+        exists = (await db.execute(
+            select(service_orders_table.c.id).where(service_orders_table.c.id == order_id)
+        )).first()
+        if exists:
+            raise HTTPException(status_code=412, detail="A ordem de serviço foi alterada por outra pessoa")
+    raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
+
+async def touch_order(db: AsyncSession, order_id: int):
+    """Marca a ordem como alterada (nova versão/ETag), ex.: ao incluir ou remover fotos"""
+    await db.execute(
+        service_orders_table.update().where(service_orders_table.c.id == order_id)
+        .values(updated_at=datetime.utcnow())
+    )
+
+async def lock_photo_file(db: AsyncSession, photo_url: str):
+    """Lock transacional por arquivo: serializa uploads e remoções do mesmo conteúdo"""
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(photo_url))))
+
+async def remove_unreferenced_file(db: AsyncSession, photo_url: str):
+    """Remove o arquivo da foto se nenhuma linha de os_photos o referencia mais
+    
+    Executada após o commit da remoção, em transação própria: a contagem é refeita sob o
+    lock do arquivo, pois um upload do mesmo conteúdo pode tê-lo referenciado de novo.
+    Uma falha aqui deixa apenas um arquivo órfão, nunca uma foto apontando para o vazio.
+    """
     try:
-        yield db
-    finally:
-        db.close()
+        await lock_photo_file(db, photo_url)
+        remaining = (await db.execute(
+            select(func.count()).select_from(os_photos_table)
+            .where(os_photos_table.c.photo_url == photo_url)
+        )).scalar()
+        if remaining == 0:
+            await run_in_threadpool(delete_stored_file, stored_path_from_url(photo_url))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("Falha ao remover arquivo da foto %s", photo_url)
 
 
 
@@ -52,16 +310,17 @@ def get_db():
 # ===== ORDENS DE SERVIÇO =====
 
 @router.get("/", response_model=List[ServiceOrderRead])
-def list_orders(
+async def list_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     status: Optional[str] = Query(None),
     user_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Lista ordens de serviço com filtros opcionais"""
-    query = select(service_orders_table)
+    # Ordem, cliente, equipamento e técnico em uma única consulta (evita N+1)
+    query = select_orders_with_relations()
     
     # Aplicar filtros
     if status:
@@ -73,165 +332,171 @@ def list_orders(
     query = query.offset(skip).limit(limit)
     
     # Executar query
-    result = db.execute(query).fetchall()
-    
-    orders = []
-    for row in result:
-        # Buscar dados relacionados
-        client = db.execute(
-            select(clients_table).where(clients_table.c.id == row.client_id)
-        ).first()
-        
-        equipment = db.execute(
-            select(equipments_table).where(equipments_table.c.id == row.equipment_id)
-        ).first()
-        
-        user = db.execute(
-            select(users_table).where(users_table.c.id == row.user_id)
-        ).first()
-        
-        order_data = {
-            "id": row.id,
-            "title": row.title,
-            "description": row.description,
-            "activities_description": row.activities_description,
-            "status": row.status,
-            "client_id": row.client_id,
-            "equipment_id": row.equipment_id,
-            "user_id": row.user_id,
-            "created_at": row.created_at,
-            "updated_at": row.updated_at,
-            "client": {
-                "id": client.id,
-                "name": client.name,
-                "email": client.email,
-                "phone": client.phone,
-                "address": client.address,
-                "created_at": client.created_at
-            } if client else None,
-            "equipment": {
-                "id": equipment.id,
-                "type": equipment.type,
-                "brand": equipment.brand,
-                "model": equipment.model,
-                "serial_number": equipment.serial_number,
-                "client_id": equipment.client_id,
-                "created_at": equipment.created_at
-            } if equipment else None,
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "name": user.name,
-                "email": user.email,
-                "role": user.role,
-                "is_active": user.is_active,
-                "created_at": user.created_at
-            } if user else None
-        }
-        orders.append(order_data)
+    result = (await db.execute(query)).fetchall()
     
-    return orders
+    return [order_from_row(row) for row in result]
 
-@router.get("/{order_id}", response_model=ServiceOrderRead)
-def get_order(
-    order_id: int,
-    db: Session = Depends(get_db),
+@router.get("/paged/", response_model=ServiceOrderPage)
+async def list_orders_paged(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    status: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
-    """Busca uma ordem de serviço por ID"""
-    order = db.execute(
-        select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    """Lista ordens de serviço com paginação por cursor (keyset em created_at, id)"""
+    query = select_orders_with_relations()
     
-    if not order:
-        raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
+    # Aplicar filtros
+    if status:
+        query = query.where(service_orders_table.c.status == status)
+    if user_id:
+        query = query.where(service_orders_table.c.user_id == user_id)
     
-    # Buscar dados relacionados
-    client = db.execute(
-        select(clients_table).where(clients_table.c.id == order.client_id)
-    ).first()
+    # Continuar a partir do último item da página anterior
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(
+            tuple_(service_orders_table.c.created_at, service_orders_table.c.id)
+            < tuple_(cursor_created_at, cursor_id)
+        )
     
-    equipment = db.execute(
-        select(equipments_table).where(equipments_table.c.id == order.equipment_id)
-    ).first()
+    # Ordem estável mesmo com inserções concorrentes; busca um item extra para saber se há próxima página
+    query = query.order_by(
+        service_orders_table.c.created_at.desc(),
+        service_orders_table.c.id.desc()
+    ).limit(limit + 1)
     
-    user = db.execute(
-        select(users_table).where(users_table.c.id == order.user_id)
-    ).first()
+    result = (await db.execute(query)).fetchall()
     
-    # Buscar fotos da ordem
-    photos = db.execute(
-        select(os_photos_table).where(os_photos_table.c.service_order_id == order_id)
-        .order_by(os_photos_table.c.uploaded_at.desc())
-    ).fetchall()
+    has_more = len(result) > limit
+    rows = result[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
     
     return {
-        "id": order.id,
-        "title": order.title,
-        "description": order.description,
-        "activities_description": order.activities_description,
-        "status": order.status,
-        "client_id": order.client_id,
-        "equipment_id": order.equipment_id,
-        "user_id": order.user_id,
-        "created_at": order.created_at,
-        "updated_at": order.updated_at,
-        "client": {
-            "id": client.id,
-            "name": client.name,
-            "email": client.email,
-            "phone": client.phone,
-            "address": client.address,
-            "created_at": client.created_at
-        } if client else None,
-        "equipment": {
-            "id": equipment.id,
-            "type": equipment.type,
-            "brand": equipment.brand,
-            "model": equipment.model,
-            "serial_number": equipment.serial_number,
-            "client_id": equipment.client_id,
-            "created_at": equipment.created_at
-        } if equipment else None,
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "name": user.name,
-            "email": user.email,
-            "role": user.role,
-            "is_active": user.is_active,
-            "created_at": user.created_at
-        } if user else None,
-        "photos": [
-            {
-                "id": photo.id,
-                "service_order_id": photo.service_order_id,
-                "photo_url": photo.photo_url,
-                "uploaded_at": photo.uploaded_at
-            }
-            for photo in photos
-        ]
+        "items": [order_from_row(row) for row in rows],
+        "next_cursor": next_cursor
     }
 
+@router.get("/search/", response_model=ServiceOrderPage)
+async def search_orders(
+    q: str = Query(..., min_length=1, max_length=200),
+    order: str = Query("relevance", pattern="^(relevance|recent)$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    status: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Busca textual em título, descrição e atividades (português, com stemming)
+    
+    Aceita a sintaxe de websearch_to_tsquery ("frase exata", -termo, or). Com order=relevance
+    os resultados vêm por ts_rank_cd e cursor em (rank, id); com order=recent, por
+    (created_at, id), o que evita calcular a relevância de todos os resultados em buscas amplas.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    query = select_orders_with_relations().where(service_orders_search_vector.bool_op("@@")(ts_query))
+    
+    # Aplicar filtros
+    if status:
+        query = query.where(service_orders_table.c.status == status)
+    if user_id:
+        query = query.where(service_orders_table.c.user_id == user_id)
+    
+    if order == "relevance":
+        # ts_rank_cd retorna real: em double precision o valor devolvido ao cliente (e gravado
+        # no cursor) é exatamente o comparado no ORDER BY e no predicado do cursor
+        rank = cast(func.ts_rank_cd(service_orders_search_vector, ts_query), Float(53))
+        query = query.add_columns(rank.label("search_rank"))
+        sort_key = (rank, service_orders_table.c.id)
+    else:
+        sort_key = (service_orders_table.c.created_at, service_orders_table.c.id)
+    
+    # Continuar a partir do último item da página anterior
+    if cursor:
+        try:
+            cursor_key = decode_rank_cursor(cursor) if order == "relevance" else decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(*sort_key) < tuple_(*cursor_key))
+    
+    query = query.order_by(*(column.desc() for column in sort_key)).limit(limit + 1)
+    
+    result = (await db.execute(query)).fetchall()
+    
+    has_more = len(result) > limit
+    rows = result[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = (
+            encode_rank_cursor(last.search_rank, last.id) if order == "relevance"
+            else encode_cursor(last.created_at, last.id)
+        )
+    
+    return {
+        "items": [order_from_row(row) for row in rows],
+        "next_cursor": next_cursor
+    }
+
+@router.get("/{order_id}", response_model=ServiceOrderRead)
+async def get_order(
+    order_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Busca uma ordem de serviço por ID
+    
+    Responde com ETag; com If-None-Match atual retorna 304 consultando apenas a versão da linha
+    e o resumo dos relacionamentos.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        current = (await db.execute(
+            select(service_orders_table.c.row_version, related_digest())
+            .select_from(_join_order_relations(service_orders_table))
+            .where(service_orders_table.c.id == order_id)
+        )).first()
+        if current:
+            etag = order_etag(order_id, current.row_version, current.related_digest)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+    
+    # Ordem, relacionamentos e fotos em uma única consulta
+    order = await load_order_detail(db, order_id)
+    
+    if not order:
+        raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
+    
+    response.headers["ETag"] = order["etag"]
+    return order
+
 @router.post("/", response_model=ServiceOrderRead)
-def create_order(
+async def create_order(
     order: ServiceOrderCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Cria uma nova ordem de serviço"""
     # Verificar se cliente existe
-    client = db.execute(
+    client = (await db.execute(
         select(clients_table).where(clients_table.c.id == order.client_id)
-    ).first()
+    )).first()
     
     if not client:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
     # Verificar se equipamento existe
-    equipment = db.execute(
+    equipment = (await db.execute(
         select(equipments_table).where(equipments_table.c.id == order.equipment_id)
-    ).first()
+    )).first()
     
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
@@ -248,13 +513,13 @@ def create_order(
     )
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.commit()
         
         # Buscar a ordem criada
-        new_order = db.execute(
+        new_order = (await db.execute(
             select(service_orders_table).where(service_orders_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
         
         return {
             "id": new_order.id,
@@ -296,24 +561,24 @@ def create_order(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao criar ordem de serviço: {e}")
 
 @router.put("/{order_id}", response_model=ServiceOrderRead)
-def update_order(
+async def update_order(
     order_id: int,
     order_update: ServiceOrderUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
-    """Atualiza uma ordem de serviço"""
-    # Verificar se ordem existe
-    existing_order = db.execute(
-        select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    """Atualiza uma ordem de serviço
     
-    if not existing_order:
-        raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
+    Com If-Match (ETag de get_order) a atualização só ocorre se ninguém alterou a ordem
+    desde a leitura; caso contrário retorna 412.
+    """
+    expected_versions = expected_order_versions(if_match, order_id)
     
     # Preparar dados para atualização
     update_data = {}
@@ -328,135 +593,88 @@ def update_order(
     
     update_data["updated_at"] = datetime.utcnow()
     
-    # Atualizar ordem
-    stmt = service_orders_table.update().where(
-        service_orders_table.c.id == order_id
-    ).values(**update_data)
-    
     try:
-        db.execute(stmt)
-        db.commit()
-        
-        # Buscar ordem atualizada
-        updated_order = db.execute(
-            select(service_orders_table).where(service_orders_table.c.id == order_id)
-        ).first()
+        # Atualizar e buscar a ordem com relacionamentos no mesmo statement
+        updated_order = await update_order_detail(db, order_id, update_data, expected_versions)
+        if not updated_order:
+            await raise_order_write_failed(db, order_id, expected_versions)
+        await db.commit()
         
-        # Buscar dados relacionados
-        client = db.execute(
-            select(clients_table).where(clients_table.c.id == updated_order.client_id)
-        ).first()
-        
-        equipment = db.execute(
-            select(equipments_table).where(equipments_table.c.id == updated_order.equipment_id)
-        ).first()
-        
-        user = db.execute(
-            select(users_table).where(users_table.c.id == updated_order.user_id)
-        ).first()
-        
-        return {
-            "id": updated_order.id,
-            "title": updated_order.title,
-            "description": updated_order.description,
-            "activities_description": updated_order.activities_description,
-            "status": updated_order.status,
-            "client_id": updated_order.client_id,
-            "equipment_id": updated_order.equipment_id,
-            "user_id": updated_order.user_id,
-            "created_at": updated_order.created_at,
-            "updated_at": updated_order.updated_at,
-            "client": {
-                "id": client.id,
-                "name": client.name,
-                "email": client.email,
-                "phone": client.phone,
-                "address": client.address,
-                "created_at": client.created_at
-            } if client else None,
-            "equipment": {
-                "id": equipment.id,
-                "type": equipment.type,
-                "brand": equipment.brand,
-                "model": equipment.model,
-                "serial_number": equipment.serial_number,
-                "client_id": equipment.client_id,
-                "created_at": equipment.created_at
-            } if equipment else None,
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "name": user.name,
-                "email": user.email,
-                "role": user.role,
-                "is_active": user.is_active,
-                "created_at": user.created_at
-            } if user else None
-        }
+        response.headers["ETag"] = updated_order["etag"]
+        return updated_order
         
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao atualizar ordem de serviço: {e}")
 
 @router.put("/{order_id}/assign-technician")
-def assign_technician(
+async def assign_technician(
     order_id: int,
-    technician_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    technician_id: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
-    """Atribui ou reatribui um técnico a uma ordem de serviço"""
-    # Verificar se ordem existe
-    existing_order = db.execute(
-        select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    """Atribui ou reatribui um técnico a uma ordem de serviço (aceita If-Match, como update_order)
     
-    if not existing_order:
-        raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
+    Sem technician_id, escolhe automaticamente o técnico ativo com menos ordens abertas.
+    """
+    expected_versions = expected_order_versions(if_match, order_id)
+    
+    auto = technician_id is None
+    if auto:
+        technician_id = (await load_technician_workload(db)).least_loaded()
+        if technician_id is None:
+            raise HTTPException(status_code=404, detail="Nenhum técnico ativo disponível")
     
     # Verificar se técnico existe e está ativo
-    technician = db.execute(
+    technician = (await db.execute(
         select(users_table).where(
             users_table.c.id == technician_id,
             users_table.c.is_active == True
         )
-    ).first()
+    )).first()
     
     if not technician:
         raise HTTPException(status_code=404, detail="Técnico não encontrado ou inativo")
     
-    # Atualizar ordem com novo técnico
-    stmt = service_orders_table.update().where(
-        service_orders_table.c.id == order_id
-    ).values(
-        user_id=technician_id,
-        updated_at=datetime.utcnow()
-    )
-    
+    assignments = {}
+    previous = {}
     try:
-        db.execute(stmt)
-        db.commit()
-        
-        # Buscar ordem atualizada
-        updated_order = db.execute(
-            select(service_orders_table).where(service_orders_table.c.id == order_id)
-        ).first()
+        if auto:
+            # Como em /auto-assign/: a carga é atualizada logo após o commit, para que a próxima
+            # escolha automática não repita o técnico antes do evento chegar. O lock da linha
+            # garante que o dono anterior lido é o que o UPDATE substitui.
+            current = (await db.execute(
+                select(service_orders_table.c.status, service_orders_table.c.user_id)
+                .where(service_orders_table.c.id == order_id)
+                .with_for_update()
+            )).first()
+            if current and current.status in OPEN_ORDER_STATUSES and current.user_id != technician_id:
+                assignments = {order_id: technician_id}
+                previous = {order_id: current.user_id}
+                technician_workload.expect_assignments(assignments)
         
-        # Buscar dados relacionados
-        client = db.execute(
-            select(clients_table).where(clients_table.c.id == updated_order.client_id)
-        ).first()
-        
-        equipment = db.execute(
-            select(equipments_table).where(equipments_table.c.id == updated_order.equipment_id)
-        ).first()
+        # Atualizar ordem com novo técnico (e buscá-la no mesmo statement)
+        updated_order = await update_order_detail(
+            db, order_id, {"user_id": technician_id, "updated_at": datetime.utcnow()}, expected_versions
+        )
+        if not updated_order:
+            await raise_order_write_failed(db, order_id, expected_versions)
+        await db.commit()
+        technician_workload.confirm_assignments(assignments, previous)
         
+        response.headers["ETag"] = updated_order["etag"]
         return {
             "message": f"Técnico {technician.name or technician.username} atribuído com sucesso",
             "order": {
-                "id": updated_order.id,
-                "title": updated_order.title,
-                "status": updated_order.status,
+                "id": updated_order["id"],
+                "title": updated_order["title"],
+                "status": updated_order["status"],
                 "technician": {
                     "id": technician.id,
                     "username": technician.username,
@@ -464,25 +682,96 @@ def assign_technician(
                     "email": technician.email,
                     "role": technician.role
                 },
-                "updated_at": updated_order.updated_at
+                "updated_at": updated_order["updated_at"]
             }
         }
         
+    except HTTPException:
+        await db.rollback()
+        technician_workload.discard_assignments(assignments)
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        technician_workload.discard_assignments(assignments)
         raise HTTPException(status_code=400, detail=f"Erro ao atribuir técnico: {e}")
 
+@router.post("/auto-assign/")
+async def auto_assign_orders(
+    assign_request: Optional[AutoAssignRequest] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Distribui ordens abertas sem técnico entre os técnicos ativos com menor carga
+    
+    Uma ordem está sem técnico quando o responsável não é técnico ativo (ex.: o administrador
+    que a criou). Sem order_ids, as `limit` mais antigas. Ordens bloqueadas por outra
+    distribuição simultânea são ignoradas (SKIP LOCKED).
+    """
+    loads = (await load_technician_workload(db)).snapshot()
+    if not loads:
+        raise HTTPException(status_code=404, detail="Nenhum técnico ativo disponível")
+    
+    query = select(service_orders_table.c.id).select_from(
+        service_orders_table.outerjoin(users_table, users_table.c.id == service_orders_table.c.user_id)
+    ).where(
+        service_orders_table.c.status.in_(OPEN_ORDER_STATUSES),
+        or_(users_table.c.role.is_distinct_from(TECHNICIAN_ROLE), users_table.c.is_active.is_not(True))
+    )
+    if assign_request and assign_request.order_ids is not None:
+        if not assign_request.order_ids:
+            return {"message": "Nenhuma ordem sem técnico para atribuir", "assignments": []}
+        query = query.where(service_orders_table.c.id.in_(assign_request.order_ids))
+    query = query.order_by(
+        service_orders_table.c.created_at, service_orders_table.c.id
+    ).limit(limit).with_for_update(of=service_orders_table, skip_locked=True)
+    
+    assignments = {}
+    try:
+        order_ids = [row.id for row in (await db.execute(query)).fetchall()]
+        if not order_ids:
+            await db.rollback()
+            return {"message": "Nenhuma ordem sem técnico para atribuir", "assignments": []}
+        
+        # Todas as atribuições em um único UPDATE ... FROM (VALUES ...)
+        assignments = plan_assignments(order_ids, loads)
+        technician_workload.expect_assignments(assignments)
+        planned = values(
+            column("order_id", Integer), column("user_id", Integer), name="planned"
+        ).data(list(assignments.items()))
+        await db.execute(
+            service_orders_table.update()
+            .where(service_orders_table.c.id == planned.c.order_id)
+            .values(user_id=planned.c.user_id, updated_at=datetime.utcnow())
+        )
+        await db.commit()
+        # Carga atualizada já: um próximo lote não espera pelos eventos do listener
+        technician_workload.confirm_assignments(assignments)
+        
+        return {
+            "message": f"{len(assignments)} ordens atribuídas",
+            "assignments": [
+                {"order_id": order_id, "technician_id": technician_id}
+                for order_id, technician_id in assignments.items()
+            ]
+        }
+        
+    except Exception as e:
+        await db.rollback()
+        technician_workload.discard_assignments(assignments)
+        raise HTTPException(status_code=400, detail=f"Erro ao atribuir ordens: {e}")
+
 @router.delete("/{order_id}")
-def delete_order(
+async def delete_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Exclui uma ordem de serviço"""
     # Verificar se ordem existe
-    existing_order = db.execute(
+    existing_order = (await db.execute(
         select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    )).first()
     
     if not existing_order:
         raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
@@ -491,8 +780,8 @@ def delete_order(
     stmt = service_orders_table.delete().where(service_orders_table.c.id == order_id)
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.commit()
         
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
@@ -500,23 +789,301 @@ def delete_order(
         return {"message": "Ordem de serviço excluída com sucesso"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao excluir ordem de serviço: {e}")
 
 
 
 
-# ===== TÉCNICOS =====
+# ===== DASHBOARD =====
 
-@router.get("/technicians/")
-def list_technicians(
-    db: Session = Depends(get_db),
+@router.get("/dashboard/", response_model=OrderDashboard)
+async def get_dashboard(
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Contagem de ordens por status, técnico e cliente
+    
+    Lida de service_order_counts (mantida por trigger): o custo não depende do
+    número de ordens, apenas do número de status, técnicos e clientes.
+    """
+    counts = service_order_counts_table
+    rows = (await db.execute(
+        select(
+            counts.c.dimension, counts.c.dimension_key, counts.c.order_count,
+            users_table.c.name.label("user_name"), clients_table.c.name.label("client_name")
+        ).select_from(
+            counts
+            .outerjoin(users_table, and_(
+                counts.c.dimension == "user", cast(users_table.c.id, Text) == counts.c.dimension_key
+            ))
+            .outerjoin(clients_table, and_(
+                counts.c.dimension == "client", cast(clients_table.c.id, Text) == counts.c.dimension_key
+            ))
+        ).where(counts.c.order_count > 0).order_by(counts.c.order_count.desc())
+    )).fetchall()
+    
+    dashboard = {"by_status": {}, "by_technician": [], "by_client": []}
+    for row in rows:
+        if row.dimension == "status":
+            dashboard["by_status"][row.dimension_key] = row.order_count
+        elif row.dimension == "user":
+            dashboard["by_technician"].append(
+                {"id": int(row.dimension_key), "name": row.user_name, "count": row.order_count}
+            )
+        elif row.dimension == "client":
+            dashboard["by_client"].append(
+                {"id": int(row.dimension_key), "name": row.client_name, "count": row.order_count}
+            )
+    
+    # Toda ordem tem cliente: a soma por cliente é o total
+    dashboard["total"] = sum(client["count"] for client in dashboard["by_client"])
+    return dashboard
+
+
+
+
+# ===== EVENTOS EM TEMPO REAL =====
+
+@router.get("/events/")
+async def stream_order_events(
+    request: Request,
+    status: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_stream_user)
+):
+    """Fluxo Server-Sent Events de criação, atualização, atribuição e exclusão de ordens
+    
+    Eventos order.created, order.updated, order.assigned e order.deleted (dados: order_id,
+    status, user_id, previous_status, previous_user_id, row_version), publicados por trigger
+    via NOTIFY. O evento resync indica que o cliente não acompanhou o ritmo e deve recarregar
+    a lista. Comentários periódicos (heartbeat) mantêm a conexão aberta em proxies.
+    
+    Autenticação: cabeçalho Authorization: Bearer ou, para o EventSource do navegador (que não
+    envia cabeçalhos), o parâmetro ?access_token=<token>.
+    """
+    # A conexão usada na autenticação volta ao pool: o fluxo pode durar horas
+    await db.rollback()
+    subscription = order_event_broker.subscribe(status, user_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                if subscription.lagged:
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.lagged = False
+                    yield format_sse("resync", {})
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), ORDER_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse(f"order.{event['type']}", event)
+        finally:
+            order_event_broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+
+
+# ===== EXPORTAÇÃO =====
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # linhas lidas do cursor por vez
+
+# Colunas do CSV: campos da ordem seguidos dos relacionamentos achatados
+EXPORT_CSV_COLUMNS = (
+    ["id", "title", "description", "activities_description", "status", "created_at", "updated_at",
+     "client_id", "equipment_id", "user_id"]
+    + [f"client_{field}" for field in CLIENT_FIELDS if field not in ("id", "created_at")]
+    + [f"equipment_{field}" for field in EQUIPMENT_FIELDS if field not in ("id", "client_id", "created_at")]
+    + [f"user_{field}" for field in ("username", "name", "email")]
+)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value)}")
+
+def _csv_record(order: dict) -> list:
+    """Achata uma ordem (formato ServiceOrderRead) nas colunas de EXPORT_CSV_COLUMNS"""
+    record = dict(order)
+    for prefix in ("client", "equipment", "user"):
+        for field, value in (order[prefix] or {}).items():
+            record[f"{prefix}_{field}"] = value
+    # Mesmo formato de data do NDJSON (isoformat) em vez do str() implícito do csv.writer
+    return [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in (record.get(column) for column in EXPORT_CSV_COLUMNS)
+    ]
+
+def stream_orders_export(query, export_format: str):
+    """Gera o arquivo de exportação em blocos de EXPORT_BATCH_SIZE linhas
+    
+    Usa conexão própria (a sessão da requisição é liberada antes do envio da resposta) e
+    cursor no servidor (stream_results/yield_per): a memória fica constante seja qual for
+    o número de ordens. Gerador síncrono, consumido pelo Starlette no threadpool.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            # Exportações longas não devem ser interrompidas pelo statement_timeout das rotas
+            conn.exec_driver_sql("SET LOCAL statement_timeout = 0")
+            result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+            
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_CSV_COLUMNS)
+                for rows in result.partitions():
+                    writer.writerows(_csv_record(order_from_row(row)) for row in rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for rows in result.partitions():
+                    yield "".join(
+                        json.dumps(order_from_row(row), default=_json_default, ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+
+@router.get("/export/")
+async def export_orders(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
-    """Lista todos os técnicos disponíveis"""
-    technicians = db.execute(
+    """Exporta ordens com cliente, equipamento e técnico em NDJSON ou CSV (streaming)
+    
+    created_from é inclusivo e created_to exclusivo. Ordenação por (created_at, id).
+    """
+    query = select_orders_with_relations()
+    
+    # Aplicar filtros
+    if status:
+        query = query.where(service_orders_table.c.status == status)
+    if user_id:
+        query = query.where(service_orders_table.c.user_id == user_id)
+    if created_from:
+        query = query.where(service_orders_table.c.created_at >= created_from)
+    if created_to:
+        query = query.where(service_orders_table.c.created_at < created_to)
+    
+    query = query.order_by(service_orders_table.c.created_at, service_orders_table.c.id)
+    
+    # A conexão usada na autenticação volta ao pool antes do streaming
+    await db.rollback()
+    
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_orders_export(query, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="ordens.{export_format}"'}
+    )
+
+
+
+
+# ===== SINCRONIZAÇÃO INCREMENTAL =====
+
+@router.get("/sync/", response_model=OrderSync)
+async def sync_orders(
+    since: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Ordens, respostas de checklist e fotos alteradas desde a última sincronização
+    
+    since é o sync_token devolvido pela chamada anterior (ausente: estado completo); com
+    user_id, apenas as ordens do técnico. Exclusões vêm em tombstones e devem ser aplicadas
+    antes das alterações. Cada chamada relê SYNC_OVERLAP_SECONDS antes da marca d'água, então
+    o cliente aplica as linhas por id (upsert), ignorando as que já possui.
+    """
+    since_at = None
+    if since:
+        try:
+            since_at = decode_sync_token(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Marca d'água no relógio do banco (o mesmo dos triggers de updated_at), antes das leituras
+    high_water_mark = (await db.execute(select(func.timezone("UTC", func.now())))).scalar()
+    
+    # Exclusões além da retenção já podem ter sido removidas: cliente recebe o estado completo
+    reset = since_at is not None and since_at < high_water_mark - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    changed_after = since_at - timedelta(seconds=SYNC_OVERLAP_SECONDS) if since_at and not reset else None
+    
+    orders_query = select_orders_with_relations()
+    responses_query = select_checklist_responses()
+    photos_query = select(os_photos_table)
+    if user_id:
+        orders_query = orders_query.where(service_orders_table.c.user_id == user_id)
+        responses_query = responses_query.join(
+            service_orders_table, service_orders_table.c.id == os_checklist_responses_table.c.service_order_id
+        ).where(service_orders_table.c.user_id == user_id)
+        photos_query = photos_query.join(
+            service_orders_table, service_orders_table.c.id == os_photos_table.c.service_order_id
+        ).where(service_orders_table.c.user_id == user_id)
+    if changed_after:
+        orders_query = orders_query.where(service_orders_table.c.updated_at > changed_after)
+        responses_query = responses_query.where(os_checklist_responses_table.c.updated_at > changed_after)
+        photos_query = photos_query.where(os_photos_table.c.updated_at > changed_after)
+    
+    orders = (await db.execute(orders_query.order_by(service_orders_table.c.id))).fetchall()
+    responses = (await db.execute(responses_query.order_by(os_checklist_responses_table.c.id))).fetchall()
+    photos = (await db.execute(photos_query.order_by(os_photos_table.c.id))).fetchall()
+    
+    tombstones = []
+    if changed_after:
+        tombstones_query = select(sync_tombstones_table).where(sync_tombstones_table.c.deleted_at > changed_after)
+        if user_id:
+            tombstones_query = tombstones_query.where(sync_tombstones_table.c.user_id == user_id)
+        else:
+            # Reatribuições só removem a OS da cópia filtrada por técnico
+            tombstones_query = tombstones_query.where(sync_tombstones_table.c.reason == "deleted")
+        tombstones = (await db.execute(tombstones_query.order_by(sync_tombstones_table.c.id))).fetchall()
+    
+    return {
+        "sync_token": encode_sync_token(high_water_mark),
+        "reset": reset,
+        "orders": [{**order_from_row(order), "row_version": order.row_version} for order in orders],
+        "checklist_responses": [checklist_response_from_row(response) for response in responses],
+        "photos": [photo_to_dict(photo) for photo in photos],
+        "tombstones": [
+            {
+                "entity": tombstone.entity,
+                "id": tombstone.entity_id,
+                "service_order_id": tombstone.service_order_id,
+                "reason": tombstone.reason,
+                "deleted_at": tombstone.deleted_at
+            }
+            for tombstone in tombstones
+        ]
+    }
+
+
+
+
+# ===== TÉCNICOS =====
+
+async def load_technicians(db: AsyncSession) -> List[dict]:
+    """Carrega os usuários ativos no formato da lista de técnicos"""
+    technicians = (await db.execute(
         select(users_table).where(users_table.c.is_active == True)
-    ).fetchall()
+    )).fetchall()
     
     return [
         {
@@ -530,18 +1097,43 @@ def list_technicians(
         for tech in technicians
     ]
 
+@router.get("/technicians/")
+async def list_technicians(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Lista todos os técnicos disponíveis (cache de referência)"""
+    return await reference_response(request, users_table.name, "active", lambda: load_technicians(db))
+
+async def load_technician_workload(db: AsyncSession):
+    """Carga dos técnicos, reagregada de service_orders se expirou ou se os usuários mudaram"""
+    users_version = reference_cache.version(users_table.name)
+    if technician_workload.is_stale(users_version):
+        loads = (await db.execute(select_technician_loads())).fetchall()
+        technician_workload.seed({technician_id: load for technician_id, load in loads}, users_version)
+    return technician_workload
+
+@router.get("/technicians/workload/")
+async def list_technician_workload(
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Ordens abertas por técnico ativo (menos carregados primeiro)"""
+    loads = (await load_technician_workload(db)).snapshot()
+    return [
+        {"technician_id": technician_id, "open_orders": load}
+        for technician_id, load in sorted(loads.items(), key=lambda item: (item[1], item[0]))
+    ]
+
 
 
 
 # ===== CLIENTES =====
 
-@router.get("/clients/", response_model=List[ClientRead])
-def list_clients(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_active_user)
-):
-    """Lista todos os clientes"""
-    clients = db.execute(select(clients_table)).fetchall()
+async def load_clients(db: AsyncSession) -> List[dict]:
+    """Carrega todos os clientes no formato ClientRead"""
+    clients = (await db.execute(select(clients_table))).fetchall()
     
     return [
         {
@@ -555,10 +1147,19 @@ def list_clients(
         for client in clients
     ]
 
+@router.get("/clients/", response_model=List[ClientRead])
+async def list_clients(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Lista todos os clientes (cache de referência)"""
+    return await reference_response(request, clients_table.name, "all", lambda: load_clients(db))
+
 @router.post("/clients/", response_model=ClientRead)
-def create_client(
+async def create_client(
     client: ClientCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Cria um novo cliente"""
@@ -570,12 +1171,14 @@ def create_client(
     )
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[clients_table.name]))
+        await db.commit()
         
-        new_client = db.execute(
+        new_client = (await db.execute(
             select(clients_table).where(clients_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
+        reference_cache.bump(clients_table.name)
         
         return {
             "id": new_client.id,
@@ -587,7 +1190,7 @@ def create_client(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao criar cliente: {e}")
 
 
@@ -596,19 +1199,14 @@ def create_client(
 
 # ===== EQUIPAMENTOS =====
 
-@router.get("/equipments/", response_model=List[EquipmentRead])
-def list_equipments(
-    client_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_active_user)
-):
-    """Lista equipamentos, opcionalmente filtrados por cliente"""
+async def load_equipments(db: AsyncSession, client_id: Optional[int]) -> List[dict]:
+    """Carrega equipamentos (opcionalmente de um cliente) no formato EquipmentRead"""
     query = select(equipments_table)
     
     if client_id:
         query = query.where(equipments_table.c.client_id == client_id)
     
-    equipments = db.execute(query).fetchall()
+    equipments = (await db.execute(query)).fetchall()
     
     return [
         {
@@ -623,17 +1221,29 @@ def list_equipments(
         for equipment in equipments
     ]
 
+@router.get("/equipments/", response_model=List[EquipmentRead])
+async def list_equipments(
+    request: Request,
+    client_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Lista equipamentos, opcionalmente filtrados por cliente (cache de referência)"""
+    return await reference_response(
+        request, equipments_table.name, client_id or "all", lambda: load_equipments(db, client_id)
+    )
+
 @router.post("/equipments/", response_model=EquipmentRead)
-def create_equipment(
+async def create_equipment(
     equipment: EquipmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Cria um novo equipamento"""
     # Verificar se cliente existe
-    client = db.execute(
+    client = (await db.execute(
         select(clients_table).where(clients_table.c.id == equipment.client_id)
-    ).first()
+    )).first()
     
     if not client:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
@@ -647,12 +1257,14 @@ def create_equipment(
     )
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[equipments_table.name]))
+        await db.commit()
         
-        new_equipment = db.execute(
+        new_equipment = (await db.execute(
             select(equipments_table).where(equipments_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
+        reference_cache.bump(equipments_table.name)
         
         return {
             "id": new_equipment.id,
@@ -665,7 +1277,7 @@ def create_equipment(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if "unique" in str(e).lower():
             raise HTTPException(status_code=400, detail="Número de série já existe")
         raise HTTPException(status_code=400, detail=f"Erro ao criar equipamento: {e}")
@@ -676,53 +1288,53 @@ def create_equipment(
 
 # ===== CHECKLISTS =====
 
+async def load_checklists(db: AsyncSession) -> List[dict]:
+    """Carrega todos os checklists com seus itens em uma única consulta (LEFT JOIN)"""
+    query = select(
+        checklists_table,
+        *_prefixed_columns(checklist_items_table, "item", CHECKLIST_ITEM_FIELDS)
+    ).select_from(
+        checklists_table.outerjoin(
+            checklist_items_table, checklist_items_table.c.checklist_id == checklists_table.c.id
+        )
+    ).order_by(checklists_table.c.id, checklist_items_table.c.id)
+    
+    checklists = {}
+    for row in (await db.execute(query)).fetchall():
+        checklist = checklists.setdefault(row.id, {"id": row.id, "name": row.name, "items": []})
+        item = _related_from_row(row, "item", CHECKLIST_ITEM_FIELDS)
+        if item:
+            checklist["items"].append(item)
+    return list(checklists.values())
+
 @router.get("/checklists/", response_model=List[ChecklistRead])
-def list_checklists(
-    db: Session = Depends(get_db),
+async def list_checklists(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
-    """Lista todos os checklists"""
-    checklists = db.execute(select(checklists_table)).fetchall()
-    
-    result = []
-    for checklist in checklists:
-        # Buscar itens do checklist
-        items = db.execute(
-            select(checklist_items_table).where(checklist_items_table.c.checklist_id == checklist.id)
-        ).fetchall()
-        
-        checklist_data = {
-            "id": checklist.id,
-            "name": checklist.name,
-            "items": [
-                {
-                    "id": item.id,
-                    "description": item.description,
-                    "checklist_id": item.checklist_id
-                }
-                for item in items
-            ]
-        }
-        result.append(checklist_data)
-    
-    return result
+    """Lista todos os checklists com seus itens (cache de referência)"""
+    # Versão única para checklists e itens: ambos são invalidados pelas rotas de criação
+    return await reference_response(request, checklists_table.name, "all", lambda: load_checklists(db))
 
 @router.post("/checklists/", response_model=ChecklistRead)
-def create_checklist(
+async def create_checklist(
     checklist: ChecklistCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Cria um novo checklist (apenas admin)"""
     stmt = checklists_table.insert().values(name=checklist.name)
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[checklists_table.name]))
+        await db.commit()
         
-        new_checklist = db.execute(
+        new_checklist = (await db.execute(
             select(checklists_table).where(checklists_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
+        reference_cache.bump(checklists_table.name)
         
         return {
             "id": new_checklist.id,
@@ -731,21 +1343,21 @@ def create_checklist(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao criar checklist: {e}")
 
 @router.post("/checklists/{checklist_id}/items/", response_model=ChecklistItemRead)
-def create_checklist_item(
+async def create_checklist_item(
     checklist_id: int,
     item: ChecklistItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Adiciona item a um checklist"""
     # Verificar se checklist existe
-    checklist = db.execute(
+    checklist = (await db.execute(
         select(checklists_table).where(checklists_table.c.id == checklist_id)
-    ).first()
+    )).first()
     
     if not checklist:
         raise HTTPException(status_code=404, detail="Checklist não encontrado")
@@ -756,12 +1368,14 @@ def create_checklist_item(
     )
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[checklists_table.name]))
+        await db.commit()
         
-        new_item = db.execute(
+        new_item = (await db.execute(
             select(checklist_items_table).where(checklist_items_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
+        reference_cache.bump(checklists_table.name)
         
         return {
             "id": new_item.id,
@@ -770,7 +1384,7 @@ def create_checklist_item(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao criar item do checklist: {e}")
 
 
@@ -779,83 +1393,80 @@ def create_checklist_item(
 
 # ===== RESPOSTAS DE CHECKLIST =====
 
+def build_checklist_responses_upsert(order_id: int, responses: List[ChecklistResponseCreate]):
+    """Sincroniza as respostas da OS com o estado enviado em um único statement
+    
+    Upsert em (service_order_id, checklist_item_id) que só altera linhas cujo valor mudou
+    (preservando responded_at das demais) e, no mesmo statement, remove os itens que não
+    vieram na lista - a lista enviada pelo frontend é o estado completo do checklist.
+    """
+    # Um item repetido na lista prevalece com o último valor (como no estado do frontend)
+    checked_by_item = {response.checklist_item_id: response.is_checked for response in responses}
+    
+    prune = os_checklist_responses_table.delete().where(
+        os_checklist_responses_table.c.service_order_id == order_id
+    )
+    if not checked_by_item:
+        return prune
+    
+    upsert = pg_insert(os_checklist_responses_table).values([
+        {"service_order_id": order_id, "checklist_item_id": item_id, "is_checked": is_checked}
+        for item_id, is_checked in checked_by_item.items()
+    ])
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[
+            os_checklist_responses_table.c.service_order_id,
+            os_checklist_responses_table.c.checklist_item_id
+        ],
+        set_={"is_checked": upsert.excluded.is_checked, "responded_at": func.current_timestamp()},
+        where=os_checklist_responses_table.c.is_checked.is_distinct_from(upsert.excluded.is_checked)
+    )
+    
+    # CTE de modificação: o upsert e a remoção são executados juntos
+    return prune.where(
+        os_checklist_responses_table.c.checklist_item_id.not_in(list(checked_by_item))
+    ).add_cte(upsert.cte("upserted_responses"))
+
 @router.get("/{order_id}/checklist-responses/")
-def get_checklist_responses(
+async def get_checklist_responses(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Busca respostas do checklist de uma ordem de serviço"""
-    responses = db.execute(
-        select(os_checklist_responses_table).where(
+    # Respostas e itens em uma única consulta
+    responses = (await db.execute(
+        select_checklist_responses().where(
             os_checklist_responses_table.c.service_order_id == order_id
         )
-    ).fetchall()
-    
-    result = []
-    for response in responses:
-        # Buscar item do checklist
-        item = db.execute(
-            select(checklist_items_table).where(
-                checklist_items_table.c.id == response.checklist_item_id
-            )
-        ).first()
-        
-        result.append({
-            "id": response.id,
-            "service_order_id": response.service_order_id,
-            "checklist_item_id": response.checklist_item_id,
-            "is_checked": response.is_checked,
-            "responded_at": response.responded_at,
-            "checklist_item": {
-                "id": item.id,
-                "description": item.description,
-                "checklist_id": item.checklist_id
-            } if item else None
-        })
-    
-    return result
+    )).fetchall()
+    
+    return [checklist_response_from_row(response) for response in responses]
 
 @router.post("/{order_id}/checklist-responses/")
-def save_checklist_responses(
+async def save_checklist_responses(
     order_id: int,
     responses: List[ChecklistResponseCreate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Salva respostas do checklist de uma ordem de serviço"""
     # Verificar se ordem existe
-    order = db.execute(
+    order = (await db.execute(
         select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    )).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
     
     try:
-        # Limpar respostas existentes
-        db.execute(
-            os_checklist_responses_table.delete().where(
-                os_checklist_responses_table.c.service_order_id == order_id
-            )
-        )
-        
-        # Inserir novas respostas
-        for response in responses:
-            db.execute(
-                os_checklist_responses_table.insert().values(
-                    service_order_id=order_id,
-                    checklist_item_id=response.checklist_item_id,
-                    is_checked=response.is_checked
-                )
-            )
-        
-        db.commit()
+        await db.execute(build_checklist_responses_upsert(order_id, responses))
+        await db.commit()
         
         return {"message": "Respostas do checklist salvas com sucesso"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao salvar respostas: {e}")
 
 
@@ -863,16 +1474,10 @@ def save_checklist_responses(
 # Endpoints para Fotos
 # =========================================
 
-# Configuração do diretório de upload
-UPLOAD_DIR = "/code/uploads"
+# Configuração de upload (diretório em utils/storage.py)
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
-def ensure_upload_dir():
-    """Garante que o diretório de upload existe"""
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 def is_allowed_file(filename: str) -> bool:
     """Verifica se o arquivo tem uma extensão permitida"""
     return any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS)
@@ -881,14 +1486,14 @@ def is_allowed_file(filename: str) -> bool:
 async def upload_photo(
     order_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Upload de uma foto para uma ordem de serviço"""
     # Verificar se ordem existe
-    order = db.execute(
+    order = (await db.execute(
         select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    )).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
@@ -900,128 +1505,144 @@ async def upload_photo(
             detail="Formato de arquivo não permitido. Use: jpg, jpeg, png, gif, bmp, webp"
         )
     
-    # Verificar tamanho do arquivo
-    file_content = await file.read()
-    if len(file_content) > MAX_FILE_SIZE:
+    # Gravar em blocos (fora do event loop), abortando assim que o tamanho máximo for ultrapassado
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    try:
+        pending = await receive_upload(file, file_extension, MAX_FILE_SIZE)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=400, 
             detail=f"Arquivo muito grande. Tamanho máximo: {MAX_FILE_SIZE // (1024*1024)}MB"
         )
+    file_path = os.path.join(UPLOAD_DIR, pending.relative_path)
+    photo_url = f"{UPLOAD_URL_PREFIX}{pending.relative_path}"
+    created = False
     
     try:
-        # Garantir que o diretório existe
-        ensure_upload_dir()
-        
-        # Gerar nome único para o arquivo
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        # Arquivos são endereçados pelo SHA-256: conteúdo repetido reaproveita o arquivo existente.
+        # O lock serializa com delete_photo para que o arquivo não seja apagado entre a
+        # verificação e a inserção da nova referência.
+        await lock_photo_file(db, photo_url)
+        created = await run_in_threadpool(store_upload, pending)
         
-        # Salvar arquivo
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
-        
-        # Salvar referência no banco
-        photo_url = f"/uploads/{unique_filename}"
+        # Salvar referência no banco (fotos fazem parte do detalhe: nova versão da ordem)
+        await touch_order(db, order_id)
+        # Foto criada devolvida pelo próprio INSERT: após o commit nada mais pode falhar aqui
         stmt = os_photos_table.insert().values(
             service_order_id=order_id,
             photo_url=photo_url
-        )
-        result = db.execute(stmt)
-        db.commit()
-        
-        # Buscar foto criada
-        photo = db.execute(
-            select(os_photos_table).where(os_photos_table.c.id == result.inserted_primary_key[0])
-        ).first()
-        
-        return {
-            "id": photo.id,
-            "service_order_id": photo.service_order_id,
-            "photo_url": photo.photo_url,
-            "uploaded_at": photo.uploaded_at
-        }
+        ).returning(*os_photos_table.c)
+        photo = (await db.execute(stmt)).first()
+        await db.commit()
         
     except Exception as e:
-        # Se houver erro, remover arquivo se foi criado
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        db.rollback()
+        # Se houver erro, remover o arquivo gravado (apenas se criado por este upload)
+        await run_in_threadpool(discard_upload, pending)
+        if created and os.path.exists(file_path):
+            await run_in_threadpool(os.remove, file_path)
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao fazer upload: {str(e)}")
+    
+    # Miniaturas geradas em segundo plano (pool de processos), fora do try: a foto já está
+    # salva. Também para arquivos reaproveitados cujas miniaturas ainda não existem.
+    await run_in_threadpool(schedule_renditions, file_path)
+    
+    return photo_to_dict(photo)
 
 @router.get("/{order_id}/photos", response_model=List[PhotoRead])
-def get_order_photos(
+async def get_order_photos(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Lista todas as fotos de uma ordem de serviço"""
     # Verificar se ordem existe
-    order = db.execute(
+    order = (await db.execute(
         select(service_orders_table).where(service_orders_table.c.id == order_id)
-    ).first()
+    )).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Ordem de serviço não encontrada")
     
     # Buscar fotos
-    photos = db.execute(
+    photos = (await db.execute(
         select(os_photos_table).where(os_photos_table.c.service_order_id == order_id)
         .order_by(os_photos_table.c.uploaded_at.desc())
-    ).fetchall()
+    )).fetchall()
     
-    return [
-        {
-            "id": photo.id,
-            "service_order_id": photo.service_order_id,
-            "photo_url": photo.photo_url,
-            "uploaded_at": photo.uploaded_at
-        }
-        for photo in photos
-    ]
+    return [photo_to_dict(photo) for photo in photos]
 
 @router.delete("/photos/{photo_id}")
-def delete_photo(
+async def delete_photo(
     photo_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Remove uma foto de uma ordem de serviço"""
     # Buscar foto
-    photo = db.execute(
+    photo = (await db.execute(
         select(os_photos_table).where(os_photos_table.c.id == photo_id)
-    ).first()
+    )).first()
     
     if not photo:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
     try:
-        # Remover arquivo do sistema
-        file_path = os.path.join(UPLOAD_DIR, os.path.basename(photo.photo_url))
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        
         # Remover registro do banco
-        db.execute(os_photos_table.delete().where(os_photos_table.c.id == photo_id))
-        db.commit()
-        
-        return {"message": "Foto removida com sucesso"}
+        await db.execute(os_photos_table.delete().where(os_photos_table.c.id == photo_id))
+        await touch_order(db, photo.service_order_id)
+        await db.commit()
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao remover foto: {str(e)}")
-
-@router.get("/uploads/{filename}")
-async def serve_uploaded_file(filename: str):
-    """Serve arquivos de upload"""
-    file_path = os.path.join(UPLOAD_DIR, filename)
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    # O arquivo pode ser compartilhado por outras fotos com o mesmo conteúdo:
+    # só é removido, após o commit, quando esta era a última referência
+    await remove_unreferenced_file(db, photo.photo_url)
     
+    return {"message": "Foto removida com sucesso"}
+
+def _stat_or_none(file_path: Optional[str]) -> Optional[os.stat_result]:
+    if not file_path:
+        return None
+    try:
+        return os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+@router.get("/uploads/{filename:path}")
+async def serve_uploaded_file(filename: str, request: Request):
+    """Serve arquivos de upload
+    
+    Responde 304 para If-None-Match / If-Modified-Since e aceita Range (206) via FileResponse.
+    Arquivos endereçados por conteúdo recebem cache imutável de longa duração.
+    """
     # Verificar se é uma imagem
     if not is_allowed_file(filename):
         raise HTTPException(status_code=403, detail="Tipo de arquivo não permitido")
     
-    from fastapi.responses import FileResponse
-    return FileResponse(file_path)
+    file_path = resolve_upload_path(filename)
+    stat_result = await run_in_threadpool(_stat_or_none, file_path)
+    content_addressed = is_content_addressed(filename)
+    
+    # Miniatura ainda não gerada: servir o original, sem cache imutável (a URL mudará de conteúdo)
+    source_filename = original_filename(filename)
+    if source_filename and file_path and stat_result is None:
+        file_path = resolve_upload_path(source_filename)
+        stat_result = await run_in_threadpool(_stat_or_none, file_path)
+        content_addressed = False
+    
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    
+    headers = file_cache_headers(file_path, stat_result, content_addressed)
+    if is_not_modified(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    
+    # Envio delegado ao proxy reverso (sendfile fora do processo Python)
+    if UPLOAD_ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = accel_redirect_path(file_path)
+        return Response(headers=headers, media_type=mimetypes.guess_type(file_path)[0])
+    
+    return FileResponse(file_path, stat_result=stat_result, headers=headers)
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..models.database import SessionLocal
+from ..models.database import get_db
 from ..models.auth import users_table
 from ..models.orders import service_orders_table
 from ..models.auth_models import UserCreate, UserRead, UserUpdate
 from ..middleware.auth import get_current_active_user, require_admin
-from ..utils.security import get_password_hash
+from ..utils.security import get_password_hash_async, invalidate_user_tokens, PasswordHasherBusy
+from ..utils.reference_cache import reference_cache
+from ..utils.invalidation import invalidation_notify
 from typing import List
 
 router = APIRouter(
@@ -14,22 +16,14 @@ router = APIRouter(
     tags=["users"]
 )
 
-# Dependência para obter a sessão
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Rotas protegidas
 @router.get("/", response_model=List[UserRead])
-def list_users(
-    db: Session = Depends(get_db),
+async def list_users(
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Lista todos os usuários (requer autenticação)"""
-    query = db.execute(users_table.select()).fetchall()
+    query = (await db.execute(users_table.select())).fetchall()
     
     # Converter tuplas para dicionários
     users = []
@@ -48,15 +42,15 @@ def list_users(
     return users
 
 @router.get("/{user_id}", response_model=UserRead)
-def get_user(
+async def get_user(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Busca um usuário por ID (requer autenticação)"""
-    query = db.execute(
+    query = (await db.execute(
         users_table.select().where(users_table.c.id == user_id)
-    ).first()
+    )).first()
     
     if not query:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -72,9 +66,9 @@ def get_user(
     }
 
 @router.post("/", response_model=UserRead)
-def create_user(
+async def create_user(
     user: UserCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(require_admin)  # Apenas admin pode criar usuários
 ):
     """Cria um novo usuário (requer privilégios de administrador)"""
@@ -85,8 +79,15 @@ def create_user(
     if user.email and "@" not in user.email:
         raise HTTPException(status_code=400, detail="Email inválido")
     
-    # Hash da senha
-    hashed_password = get_password_hash(user.password)
+    # Hash da senha (no pool de processos do bcrypt)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado. Tente novamente em instantes.",
+            headers={"Retry-After": "1"}
+        )
     
     stmt = users_table.insert().values(
         username=user.username,
@@ -97,13 +98,15 @@ def create_user(
     )
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[users_table.name]))
+        await db.commit()
+        reference_cache.bump(users_table.name)
         
         # Buscar o usuário criado
-        new_user = db.execute(
+        new_user = (await db.execute(
             users_table.select().where(users_table.c.id == result.inserted_primary_key[0])
-        ).first()
+        )).first()
         
         return {
             "id": new_user.id,
@@ -116,23 +119,23 @@ def create_user(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if "unique" in str(e).lower():
             raise HTTPException(status_code=400, detail="Username ou email já existem")
         raise HTTPException(status_code=400, detail=f"Erro ao criar usuário: {e}")
 
 @router.put("/{user_id}", response_model=UserRead)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(require_admin)  # Apenas admin pode atualizar usuários
 ):
     """Atualiza um usuário (requer privilégios de administrador)"""
     # Verificar se usuário existe
-    existing_user = db.execute(
+    existing_user = (await db.execute(
         users_table.select().where(users_table.c.id == user_id)
-    ).first()
+    )).first()
     
     if not existing_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -152,7 +155,14 @@ def update_user(
     
     # Atualizar senha se fornecida
     if user_update.password is not None and user_update.password.strip():
-        update_data["password_hash"] = get_password_hash(user_update.password)
+        try:
+            update_data["password_hash"] = await get_password_hash_async(user_update.password)
+        except PasswordHasherBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado. Tente novamente em instantes.",
+                headers={"Retry-After": "1"}
+            )
     
     if not update_data:
         raise HTTPException(status_code=400, detail="Nenhum dado fornecido para atualização")
@@ -163,16 +173,21 @@ def update_user(
     ).values(**update_data)
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[users_table.name], user_ids=[user_id]))
+        await db.commit()
         
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
         
+        # Tokens em cache carregam o usuário antigo (papel, status ativo)
+        invalidate_user_tokens(user_id)
+        reference_cache.bump(users_table.name)
+        
         # Buscar usuário atualizado
-        updated_user = db.execute(
+        updated_user = (await db.execute(
             users_table.select().where(users_table.c.id == user_id)
-        ).first()
+        )).first()
         
         return {
             "id": updated_user.id,
@@ -185,22 +200,22 @@ def update_user(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if "unique" in str(e).lower():
             raise HTTPException(status_code=400, detail="Username ou email já existem")
         raise HTTPException(status_code=400, detail=f"Erro ao atualizar usuário: {e}")
 
 @router.delete("/{user_id}")
-def delete_user(
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(require_admin)  # Apenas admin pode deletar usuários
 ):
     """Exclui um usuário permanentemente (requer privilégios de administrador)"""
     # Verificar se usuário existe
-    existing_user = db.execute(
+    existing_user = (await db.execute(
         users_table.select().where(users_table.c.id == user_id)
-    ).first()
+    )).first()
     
     if not existing_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -210,9 +225,9 @@ def delete_user(
         raise HTTPException(status_code=400, detail="Você não pode excluir a si mesmo")
     
     # Verificar se o usuário tem ordens de serviço associadas
-    orders_count = db.execute(
+    orders_count = (await db.execute(
         select(service_orders_table.c.id).where(service_orders_table.c.user_id == user_id)
-    ).fetchall()
+    )).fetchall()
     
     if orders_count:
         count = len(orders_count)
@@ -225,24 +240,28 @@ def delete_user(
     stmt = users_table.delete().where(users_table.c.id == user_id)
     
     try:
-        result = db.execute(stmt)
-        db.commit()
+        result = await db.execute(stmt)
+        await db.execute(invalidation_notify(tables=[users_table.name], user_ids=[user_id]))
+        await db.commit()
         
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
         
+        invalidate_user_tokens(user_id)
+        reference_cache.bump(users_table.name)
+        
         return {"message": "Usuário excluído com sucesso"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Verificar se é erro de foreign key
         error_str = str(e).lower()
         if "foreign key" in error_str or "violates foreign key constraint" in error_str or "service_orders" in error_str:
             # Contar quantas ordens estão vinculadas
             try:
-                orders_count = db.execute(
+                orders_count = (await db.execute(
                     select(service_orders_table.c.id).where(service_orders_table.c.user_id == user_id)
-                ).fetchall()
+                )).fetchall()
                 count = len(orders_count)
                 raise HTTPException(
                     status_code=400,
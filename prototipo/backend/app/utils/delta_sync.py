@@ -0,0 +1,60 @@
+import os
+import logging
+import threading
+from typing import Optional
+from sqlalchemy import select, func, text
+
+from ..models.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Janela relida a cada sincronização: cobre transações que confirmaram linhas com
+# updated_at anterior à marca d'água já entregue ao cliente
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "120"))
+# Exclusões mais antigas são removidas; clientes mais atrasados recebem o estado completo
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+# Intervalo da limpeza de sync_tombstones (0 desativa)
+SYNC_TOMBSTONES_PURGE_SECONDS = float(os.getenv("SYNC_TOMBSTONES_PURGE_SECONDS", "86400"))
+
+_purge_thread: Optional[threading.Thread] = None
+_purge_stop = threading.Event()
+
+def purge_sync_tombstones() -> Optional[int]:
+    """Remove exclusões fora da retenção; retorna as linhas removidas ou None se outro worker já está rodando"""
+    with engine.begin() as conn:
+        acquired = conn.execute(
+            select(func.pg_try_advisory_xact_lock(func.hashtext("sync_tombstones_purge")))
+        ).scalar()
+        if not acquired:
+            return None
+        return conn.execute(
+            text("SELECT sync_tombstones_purge(make_interval(days => :days))"),
+            {"days": SYNC_TOMBSTONE_RETENTION_DAYS}
+        ).scalar()
+
+def _purge_forever():
+    while not _purge_stop.wait(SYNC_TOMBSTONES_PURGE_SECONDS):
+        try:
+            purged = purge_sync_tombstones()
+            if purged:
+                logger.info("Exclusões antigas de sincronização removidas: %s linhas", purged)
+        except Exception:
+            logger.exception("Falha ao limpar sync_tombstones")
+
+def start_sync_tombstones_purger():
+    """Inicia a limpeza periódica de sync_tombstones (uma thread por worker)"""
+    global _purge_thread
+    if SYNC_TOMBSTONES_PURGE_SECONDS <= 0 or _purge_thread is not None:
+        return
+    _purge_stop.clear()
+    _purge_thread = threading.Thread(target=_purge_forever, name="sync-tombstones-purge", daemon=True)
+    _purge_thread.start()
+
+def stop_sync_tombstones_purger():
+    """Encerra a thread de limpeza (chamado no shutdown da aplicação)"""
+    global _purge_thread
+    if _purge_thread is None:
+        return
+    _purge_stop.set()
+    _purge_thread.join(timeout=5)
+    _purge_thread = None
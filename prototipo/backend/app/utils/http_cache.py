@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Mapping
+
+# Arquivos endereçados por conteúdo nunca mudam: podem ficar no cache por um ano
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Demais arquivos: cache permitido, mas sempre revalidado (ETag / Last-Modified)
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+def file_etag(file_path: str, stat_result: os.stat_result, content_addressed: bool) -> str:
+    """ETag forte do arquivo: o próprio nome quando endereçado por conteúdo, senão mtime + tamanho"""
+    if content_addressed:
+        return f'"{os.path.basename(file_path)}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def file_cache_headers(
+    file_path: str, stat_result: os.stat_result, content_addressed: bool
+) -> Dict[str, str]:
+    """Validadores e Cache-Control para servir um arquivo"""
+    return {
+        "ETag": file_etag(file_path, stat_result, content_addressed),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if content_addressed else REVALIDATE_CACHE_CONTROL,
+    }
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparação fraca de If-None-Match (lista de ETags ou '*')"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def is_not_modified(request_headers: Mapping[str, str], cache_headers: Mapping[str, str]) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since para responder 304"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, cache_headers["ETag"])
+    
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in cache_headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            last_modified = parsedate_to_datetime(cache_headers["Last-Modified"])
+        except (TypeError, ValueError):
+            return False
+        return isinstance(since, datetime) and last_modified <= since
+    return False
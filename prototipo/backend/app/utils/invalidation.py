@@ -0,0 +1,65 @@
+import os
+import json
+from typing import Iterable
+from sqlalchemy import select, func
+
+from .pg_listener import PgListener
+
+# Barramento de invalidação entre workers/réplicas via LISTEN/NOTIFY do Postgres
+INVALIDATION_CHANNEL = "cache_invalidation"
+CACHE_INVALIDATION_LISTEN = os.getenv("CACHE_INVALIDATION_LISTEN", "true").lower() in ("1", "true", "yes")
+INVALIDATION_RECONNECT_SECONDS = float(os.getenv("INVALIDATION_RECONNECT_SECONDS", "5"))
+
+def invalidation_notify(
+    tables: Iterable[str] = (), user_ids: Iterable[int] = (), token_keys: Iterable[str] = ()
+):
+    """Statement que publica um evento de invalidação
+    
+    Deve ser executado na mesma transação da escrita (antes do commit): o Postgres só
+    entrega o NOTIFY após o commit e o descarta em caso de rollback. Serve tanto para
+    Session quanto para AsyncSession.
+    """
+    payload = json.dumps({
+        "tables": list(tables),
+        "user_ids": list(user_ids),
+        "token_keys": list(token_keys)
+    })
+    return select(func.pg_notify(INVALIDATION_CHANNEL, payload))
+
+def apply_invalidation(payload: str):
+    """Aplica um evento recebido: remove as chaves afetadas dos caches deste processo"""
+    from .reference_cache import reference_cache
+    from .security import token_cache, invalidate_user_tokens
+    
+    event = json.loads(payload)
+    for table in event.get("tables", []):
+        reference_cache.bump(table)
+    for user_id in event.get("user_ids", []):
+        invalidate_user_tokens(user_id)
+    for token_key in event.get("token_keys", []):
+        token_cache.pop(token_key)
+
+def _flush_caches():
+    """Após (re)conectar, eventos podem ter sido perdidos: descarta todos os caches"""
+    from .reference_cache import reference_cache
+    from .security import token_cache
+    
+    reference_cache.clear()
+    token_cache.clear()
+
+_listener = PgListener(
+    "cache-invalidation",
+    [INVALIDATION_CHANNEL],
+    on_notify=lambda channel, payload: apply_invalidation(payload),
+    on_connect=_flush_caches,
+    reconnect_seconds=INVALIDATION_RECONNECT_SECONDS
+)
+
+def start_invalidation_listener():
+    """Inicia a thread que consome os eventos de invalidação (uma por worker)"""
+    if CACHE_INVALIDATION_LISTEN:
+        _listener.start()
+
+def stop_invalidation_listener():
+    """Encerra a thread de escuta (chamado no shutdown da aplicação)"""
+    _listener.stop()
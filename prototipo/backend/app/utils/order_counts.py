@@ -0,0 +1,56 @@
+import os
+import logging
+import threading
+from typing import Optional
+from sqlalchemy import select, func, text
+
+from ..models.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Reconciliação periódica dos contadores do dashboard (0 desativa)
+ORDER_COUNTS_RECONCILE_SECONDS = float(os.getenv("ORDER_COUNTS_RECONCILE_SECONDS", "3600"))
+
+_reconcile_thread: Optional[threading.Thread] = None
+_reconcile_stop = threading.Event()
+
+def reconcile_order_counts() -> Optional[int]:
+    """Recalcula service_order_counts; retorna as linhas corrigidas ou None se outro worker já está rodando
+    
+    Um lock consultivo transacional garante uma única reconciliação por vez entre workers e réplicas;
+    as escritas em service_orders seguem normalmente (correções aplicadas como delta, initdb/13).
+    """
+    with engine.begin() as conn:
+        acquired = conn.execute(
+            select(func.pg_try_advisory_xact_lock(func.hashtext("service_order_counts_reconcile")))
+        ).scalar()
+        if not acquired:
+            return None
+        return conn.execute(text("SELECT service_order_counts_reconcile()")).scalar()
+
+def _reconcile_forever():
+    while not _reconcile_stop.wait(ORDER_COUNTS_RECONCILE_SECONDS):
+        try:
+            corrected = reconcile_order_counts()
+            if corrected:
+                logger.warning("Contadores de ordens divergentes corrigidos: %s linhas", corrected)
+        except Exception:
+            logger.exception("Falha ao reconciliar contadores de ordens")
+
+def start_order_counts_reconciler():
+    """Inicia a reconciliação periódica dos contadores (uma thread por worker)"""
+    global _reconcile_thread
+    if ORDER_COUNTS_RECONCILE_SECONDS <= 0 or _reconcile_thread is not None:
+        return
+    _reconcile_stop.clear()
+    _reconcile_thread = threading.Thread(target=_reconcile_forever, name="order-counts-reconcile", daemon=True)
+    _reconcile_thread.start()
+
+def stop_order_counts_reconciler():
+    """Encerra a thread de reconciliação (chamado no shutdown da aplicação)"""
+    global _reconcile_thread
+    if _reconcile_thread is None:
+        return
+    _reconcile_stop.set()
+    _reconcile_thread.join(timeout=5)
+    _reconcile_thread = None
@@ -0,0 +1,107 @@
+import os
+import json
+import asyncio
+import threading
+from typing import Callable, List, Optional, Set, Tuple
+
+from .pg_listener import PgListener
+
+# Eventos de ordens de serviço publicados por trigger (initdb/11_order_events_notify.sql)
+ORDER_EVENTS_CHANNEL = "order_events"
+ORDER_EVENTS_QUEUE_SIZE = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "256"))  # eventos pendentes por cliente
+ORDER_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+class OrderEventSubscription:
+    """Fila de eventos de um cliente conectado, com filtros opcionais por status e técnico"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, status: Optional[str], user_id: Optional[int]):
+        self.loop = loop
+        self.status = status
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=ORDER_EVENTS_QUEUE_SIZE)
+        self.lagged = False  # fila estourou: o cliente precisa recarregar o estado
+
+    def matches(self, event: dict) -> bool:
+        """Uma ordem que entra ou sai do filtro (ex.: reatribuída a outro técnico) também é notificada"""
+        if self.status and self.status not in (event.get("status"), event.get("previous_status")):
+            return False
+        if self.user_id and self.user_id not in (event.get("user_id"), event.get("previous_user_id")):
+            return False
+        return True
+
+    def push(self, event: dict):
+        """Executado no event loop do cliente"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+class OrderEventBroker:
+    """Distribui as notificações de order_events a todos os clientes SSE do processo
+    
+    Uma única conexão LISTEN por worker, iniciada com o primeiro assinante ou consumidor.
+    """
+
+    def __init__(self):
+        self._subscriptions: Set[OrderEventSubscription] = set()
+        self._consumers: List[Tuple[Callable[[dict], None], Optional[Callable[[], None]]]] = []
+        self._lock = threading.Lock()
+        self._listener = PgListener(
+            "order-events", [ORDER_EVENTS_CHANNEL], on_notify=self._on_notify, on_connect=self._on_connect
+        )
+
+    def subscribe(self, status: Optional[str] = None, user_id: Optional[int] = None) -> OrderEventSubscription:
+        subscription = OrderEventSubscription(asyncio.get_running_loop(), status, user_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self._listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription: OrderEventSubscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def add_consumer(self, on_event: Callable[[dict], None], on_connect: Optional[Callable[[], None]] = None):
+        """Registra um consumidor interno, chamado na thread do listener a cada evento
+        
+        on_connect é chamado a cada (re)conexão: eventos anteriores podem ter sido perdidos.
+        """
+        with self._lock:
+            self._consumers.append((on_event, on_connect))
+        self._listener.start()
+
+    def _on_connect(self):
+        with self._lock:
+            consumers = list(self._consumers)
+        for _, on_connect in consumers:
+            if on_connect:
+                on_connect()
+
+    def _on_notify(self, channel: str, payload: str):
+        """Executado na thread do listener: entrega o evento no event loop de cada assinante"""
+        event = json.loads(payload)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.push, event)
+                except RuntimeError:  # event loop já encerrado
+                    self.unsubscribe(subscription)
+        with self._lock:
+            consumers = list(self._consumers)
+        for on_event, _ in consumers:
+            on_event(event)
+
+    def stop(self):
+        self._listener.stop()
+
+order_event_broker = OrderEventBroker()
+
+def stop_order_events():
+    """Encerra o listener de eventos de ordens (chamado no shutdown da aplicação)"""
+    order_event_broker.stop()
+
+def format_sse(event: str, data: dict) -> str:
+    """Formata uma mensagem Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+
+def _encode_payload(payload: dict) -> str:
+    data = json.dumps(payload)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_payload(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Gera cursor opaco a partir da chave (created_at, id) do último item da página"""
+    return _encode_payload({"created_at": created_at.isoformat(), "id": order_id})
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodifica cursor opaco em (created_at, id); lança ValueError se inválido"""
+    try:
+        payload = _decode_payload(cursor)
+        return datetime.fromisoformat(payload["created_at"]), int(payload["id"])
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+def encode_sync_token(high_water_mark: datetime) -> str:
+    """Gera token opaco com a marca d'água da sincronização incremental"""
+    return _encode_payload({"since": high_water_mark.isoformat()})
+
+def decode_sync_token(token: str) -> datetime:
+    """Decodifica token de sincronização em datetime; lança ValueError se inválido"""
+    try:
+        return datetime.fromisoformat(_decode_payload(token)["since"])
+    except Exception as e:
+        raise ValueError("Token de sincronização inválido") from e
+
+def encode_rank_cursor(rank: float, order_id: int) -> str:
+    """Gera cursor opaco para resultados ordenados por relevância (rank, id)"""
+    return _encode_payload({"rank": rank, "id": order_id})
+
+def decode_rank_cursor(cursor: str) -> tuple:
+    """Decodifica cursor de relevância em (rank, id); lança ValueError se inválido"""
+    try:
+        payload = _decode_payload(cursor)
+        return float(payload["rank"]), int(payload["id"])
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
@@ -0,0 +1,99 @@
+import select as select_module
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+import psycopg2
+import psycopg2.extensions
+
+from ..models.database import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+
+logger = logging.getLogger(__name__)
+
+class PgListener:
+    """Thread com conexão dedicada ao Postgres que escuta canais (LISTEN) e repassa as notificações
+    
+    Reconecta automaticamente; on_connect é chamado a cada (re)conexão, já que notificações
+    enviadas enquanto a conexão estava fora são perdidas. Qualquer falha (banco, rede ou o próprio
+    on_connect) é registrada e a espera entre tentativas dobra até max_reconnect_seconds, para a
+    thread nunca morrer em silêncio nem martelar um banco fora do ar.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        channels: Iterable[str],
+        on_notify: Callable[[str, str], None],
+        on_connect: Optional[Callable[[], None]] = None,
+        reconnect_seconds: float = 5,
+        max_reconnect_seconds: float = 60
+    ):
+        self.name = name
+        self.channels = list(channels)
+        self.on_notify = on_notify
+        self.on_connect = on_connect
+        self.reconnect_seconds = reconnect_seconds
+        self.max_reconnect_seconds = max_reconnect_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = psycopg2.connect(
+            host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME,
+            application_name=f"{self.name}-listener"
+        )
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = connection.cursor()
+        for channel in self.channels:
+            cursor.execute(f"LISTEN {channel}")
+        return connection
+
+    def _run(self):
+        delay = self.reconnect_seconds
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                if self.on_connect:
+                    self.on_connect()
+                delay = self.reconnect_seconds
+                
+                while not self._stop.is_set():
+                    # Acorda periodicamente para verificar o pedido de parada
+                    if select_module.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            self.on_notify(notify.channel, notify.payload)
+                        except Exception:
+                            logger.exception("Falha ao processar notificação de %s: %s", notify.channel, notify.payload)
+            except Exception:
+                logger.exception("Listener %s desconectado; nova tentativa em %.1fs", self.name, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_seconds)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        """Inicia a thread de escuta (idempotente)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Encerra a thread de escuta"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from .cache import TTLCache
+from .http_cache import is_not_modified
+
+# Listas de referência (clientes, equipamentos, técnicos, checklists) mudam poucas vezes ao dia
+REFERENCE_CACHE_MAXSIZE = int(os.getenv("REFERENCE_CACHE_MAXSIZE", "1024"))
+REFERENCE_CACHE_TTL_SECONDS = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+
+@dataclass(frozen=True)
+class CachedReference:
+    """Resposta já serializada de uma lista de referência"""
+    body: bytes
+    etag: str
+
+class ReferenceCache:
+    """Cache versionado: cada tabela tem um contador de versão incrementado nas escritas
+    
+    As entradas são indexadas por (tabela, versão, chave). Incrementar a versão torna
+    inalcançáveis as entradas antigas - inclusive as que uma leitura concorrente ainda
+    vai gravar com a versão capturada antes da escrita. O TTL limita o tempo de vida
+    de dados alterados por outros processos.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, table: str) -> int:
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    def bump(self, table: str):
+        """Registra uma escrita na tabela, invalidando suas listas em cache"""
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+        self._entries.evict_where(lambda key, value: key[0] == table)
+
+    def get(self, table: str, key: Hashable) -> Optional[CachedReference]:
+        return self._entries.get((table, self.version(table), key))
+
+    def set(self, table: str, version: int, key: Hashable, value: CachedReference):
+        self._entries.set((table, version, key), value)
+
+    def clear(self):
+        self._entries.clear()
+
+reference_cache = ReferenceCache(maxsize=REFERENCE_CACHE_MAXSIZE, ttl=REFERENCE_CACHE_TTL_SECONDS)
+
+def serialize_reference(payload) -> CachedReference:
+    """Serializa a lista como o JSONResponse do FastAPI e calcula sua ETag"""
+    body = json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+    return CachedReference(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+async def reference_response(
+    request: Request, table: str, key: Hashable, loader: Callable[[], Awaitable]
+) -> Response:
+    """Responde uma lista de referência a partir do cache (304 se a ETag do cliente for atual)
+    
+    A ETag é calculada uma vez por versão carregada, a partir do conteúdo: é a mesma em
+    todos os workers e continua válida após recargas por TTL quando nada mudou.
+    """
+    version = reference_cache.version(table)
+    cached = reference_cache.get(table, key)
+    if cached is None:
+        cached = serialize_reference(await loader())
+        reference_cache.set(table, version, key, cached)
+    
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if is_not_modified(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
@@ -1,5 +1,12 @@
 import os
+import time
+import hashlib
+import asyncio
+import threading
+import multiprocessing
 import bcrypt
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 # from passlib.context import CryptContext
@@ -7,12 +14,34 @@ from typing import Optional
 from sqlalchemy.orm import Session
 from ..models.database import SessionLocal
 from ..models.auth import users_table, auth_tokens_table
+from .cache import TTLCache
+from .invalidation import invalidation_notify
 
 # Configurações de segurança
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Cache de tokens já validados (hash do token -> usuário), evita consultas ao banco a cada requisição
+TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+
+token_cache = TTLCache(maxsize=TOKEN_CACHE_MAXSIZE, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+# Pool de processos dedicado ao bcrypt (~250ms de CPU por chamada), fora do threadpool das rotas
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))  # jobs em execução + na fila
+
+class PasswordHasherBusy(Exception):
+    """Fila do pool de bcrypt cheia; a requisição deve ser recusada (503)"""
+
+class PasswordHasherUnavailable(PasswordHasherBusy):
+    """Pool de bcrypt quebrado mesmo após ser recriado (503)"""
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+_password_pool_lock = threading.Lock()
+_password_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
 # Contexto para hash de senhas
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -31,6 +60,75 @@ def get_password_hash(password: str) -> str:
     """Gera hash da senha"""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
+def _get_password_pool() -> ProcessPoolExecutor:
+    """Cria o pool de processos do bcrypt sob demanda"""
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None:
+            _password_pool = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _password_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """Descarta o pool quebrado (ex.: worker morto por falta de memória); o próximo job cria outro"""
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is pool:
+            _password_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _on_password_job_done(pool: ProcessPoolExecutor, future: Future):
+    _password_slots.release()
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_broken_pool(pool)
+
+def submit_password_job(fn, *args) -> Future:
+    """Executa verify_password/get_password_hash no pool; lança PasswordHasherBusy se saturado"""
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    pool = _get_password_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except Exception as e:
+        _password_slots.release()
+        if isinstance(e, BrokenProcessPool):
+            _discard_broken_pool(pool)
+        raise
+    future.add_done_callback(lambda done: _on_password_job_done(pool, done))
+    return future
+
+async def run_password_job(fn, *args):
+    """Aguarda o job no pool; com o pool quebrado, recria e tenta mais uma vez (senão 503)"""
+    try:
+        return await asyncio.wrap_future(submit_password_job(fn, *args))
+    except BrokenProcessPool:
+        pass
+    try:
+        return await asyncio.wrap_future(submit_password_job(fn, *args))
+    except BrokenProcessPool as e:
+        raise PasswordHasherUnavailable() from e
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica a senha no pool de processos sem bloquear o event loop"""
+    if not hashed_password.startswith('$2b$'):
+        # Senha legada em texto plano: não há trabalho de CPU a delegar
+        return verify_password(plain_password, hashed_password)
+    return await run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Gera o hash da senha no pool de processos sem bloquear o event loop"""
+    return await run_password_job(get_password_hash, password)
+
+def shutdown_password_pool():
+    """Encerra o pool de processos do bcrypt"""
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is not None:
+            _password_pool.shutdown(wait=False, cancel_futures=True)
+            _password_pool = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Cria token JWT"""
     to_encode = data.copy()
@@ -74,6 +172,18 @@ def authenticate_user(db: Session, username: str, password: str):
     
     return user
 
+async def authenticate_user_async(db, username: str, password: str):
+    """Autentica usuário: consulta via sessão assíncrona e bcrypt no pool de processos"""
+    user = await db.run_sync(get_user_by_username, username)
+    
+    if not user or not user.is_active:
+        return False
+    
+    if not await verify_password_async(password, user.password_hash):
+        return False
+    
+    return user
+
 def get_user_by_username(db: Session, username: str):
     """Busca usuário por username"""
     user = db.execute(
@@ -97,7 +207,10 @@ def revoke_token(db: Session, token: str):
         auth_tokens_table.c.token == token
     ).values(is_revoked=True)
     db.execute(stmt)
+    # Demais workers removem o token dos seus caches após o commit
+    db.execute(invalidation_notify(token_keys=[token_cache_key(token)]))
     db.commit()
+    token_cache.pop(token_cache_key(token))
 
 def is_token_revoked(db: Session, token: str) -> bool:
     """Verifica se token foi revogado"""
@@ -111,3 +224,21 @@ def is_token_revoked(db: Session, token: str) -> bool:
         return True  # Token não existe = considerado revogado
     
     return result.is_revoked or (result.expires_at and result.expires_at < datetime.utcnow())
+
+def token_cache_key(token: str) -> str:
+    """Chave do token no cache (SHA-256): o token em si não circula nos eventos de invalidação"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def get_cached_user(token: str):
+    """Retorna o usuário de um token validado recentemente (ou None)"""
+    return token_cache.get(token_cache_key(token))
+
+def cache_authenticated_user(token: str, payload: dict, user):
+    """Guarda o usuário resolvido para o token, sem ultrapassar o exp do JWT"""
+    exp = payload.get("exp")
+    ttl = exp - time.time() if exp else TOKEN_CACHE_TTL_SECONDS
+    token_cache.set(token_cache_key(token), user, ttl=ttl)
+
+def invalidate_user_tokens(user_id: int) -> int:
+    """Remove do cache todos os tokens de um usuário (após atualização ou exclusão)"""
+    return token_cache.evict_where(lambda token, user: user.id == user_id)
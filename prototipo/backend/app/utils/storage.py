@@ -0,0 +1,121 @@
+import os
+import re
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from .thumbnails import remove_renditions
+
+# Configuração do diretório de upload
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/code/uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))  # bytes lidos/gravados por vez
+UPLOAD_URL_PREFIX = "/uploads/"
+# Prefixo interno do proxy reverso (ex.: /_uploads/ no nginx): quando definido, o envio do
+# arquivo é delegado ao proxy via X-Accel-Redirect (sendfile, Range e cache no próprio proxy)
+UPLOAD_ACCEL_REDIRECT_PREFIX = os.getenv("UPLOAD_ACCEL_REDIRECT_PREFIX", "")
+
+_CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}\.")
+
+class UploadTooLarge(Exception):
+    """Upload ultrapassou o tamanho máximo permitido"""
+
+@dataclass
+class PendingUpload:
+    """Upload recebido em arquivo temporário, ainda não movido para o armazenamento definitivo"""
+    temp_path: str
+    content_hash: str
+    extension: str
+
+    @property
+    def relative_path(self) -> str:
+        """Caminho endereçado por conteúdo: <h[0:2]>/<h[2:4]>/<sha256><ext>"""
+        return os.path.join(self.content_hash[:2], self.content_hash[2:4], f"{self.content_hash}{self.extension}")
+
+def ensure_upload_dir():
+    """Garante que o diretório de upload existe"""
+    if not os.path.exists(UPLOAD_DIR):
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+def resolve_upload_path(relative_path: str) -> Optional[str]:
+    """Caminho absoluto de um arquivo em UPLOAD_DIR (None se escapar do diretório)"""
+    root = os.path.realpath(UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    return path if path.startswith(root + os.sep) else None
+
+def is_content_addressed(relative_path: str) -> bool:
+    """Indica se o arquivo (ou versão reduzida) é nomeado pelo SHA-256 do conteúdo"""
+    return bool(_CONTENT_ADDRESSED_NAME.match(os.path.basename(relative_path)))
+
+def accel_redirect_path(file_path: str) -> str:
+    """Caminho interno do proxy para X-Accel-Redirect"""
+    relative_path = os.path.relpath(file_path, os.path.realpath(UPLOAD_DIR))
+    return f"{UPLOAD_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
+
+def stored_path_from_url(photo_url: str) -> str:
+    """Caminho relativo em UPLOAD_DIR a partir da photo_url salva no banco"""
+    return photo_url[len(UPLOAD_URL_PREFIX):] if photo_url.startswith(UPLOAD_URL_PREFIX) else os.path.basename(photo_url)
+
+def _write_chunk(temp_file, hasher, chunk: bytes):
+    temp_file.write(chunk)
+    hasher.update(chunk)
+
+def discard_upload(pending: PendingUpload):
+    """Remove o arquivo temporário de um upload não aproveitado"""
+    if os.path.exists(pending.temp_path):
+        os.remove(pending.temp_path)
+
+async def receive_upload(file: UploadFile, extension: str, max_size: int) -> PendingUpload:
+    """Grava o upload em blocos num arquivo temporário, calculando o SHA-256 do conteúdo.
+    
+    A memória usada fica limitada a UPLOAD_CHUNK_SIZE e toda escrita em disco roda fora do
+    event loop. Lança UploadTooLarge assim que max_size é ultrapassado.
+    """
+    await run_in_threadpool(ensure_upload_dir)
+    temp_file = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, dir=UPLOAD_DIR, prefix=".upload-", suffix=extension, delete=False
+    )
+    hasher = hashlib.sha256()
+    
+    try:
+        size = 0
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge()
+            await run_in_threadpool(_write_chunk, temp_file, hasher, chunk)
+    except BaseException:
+        await run_in_threadpool(temp_file.close)
+        await run_in_threadpool(os.remove, temp_file.name)
+        raise
+    
+    await run_in_threadpool(temp_file.close)
+    return PendingUpload(temp_path=temp_file.name, content_hash=hasher.hexdigest(), extension=extension)
+
+def store_upload(pending: PendingUpload) -> bool:
+    """Move o upload para o caminho endereçado por conteúdo.
+    
+    Se o mesmo conteúdo já estiver armazenado, descarta o temporário (deduplicação).
+    Retorna True se um novo arquivo foi criado.
+    """
+    target_path = os.path.join(UPLOAD_DIR, pending.relative_path)
+    if os.path.exists(target_path):
+        discard_upload(pending)
+        return False
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    os.replace(pending.temp_path, target_path)
+    return True
+
+def delete_stored_file(relative_path: str):
+    """Remove um arquivo armazenado e suas versões reduzidas"""
+    path = resolve_upload_path(relative_path)
+    if path is None:
+        return
+    if os.path.exists(path):
+        os.remove(path)
+    remove_renditions(path)
@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele as fotos são servidas apenas no original
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Versões reduzidas geradas para cada foto (maior lado em pixels)
+RENDITIONS = {
+    "thumbnail": 256,
+    "preview": 1024,
+}
+RENDITION_SUFFIX = ".jpg"
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+_thumbnail_pool: Optional[ProcessPoolExecutor] = None
+_thumbnail_pool_lock = threading.Lock()
+
+def rendition_filename(filename: str, rendition: str) -> str:
+    """Nome do arquivo de uma versão reduzida: <original>.<versão>.jpg"""
+    return f"{filename}.{rendition}{RENDITION_SUFFIX}"
+
+def original_filename(filename: str) -> Optional[str]:
+    """Se filename for uma versão reduzida, retorna o nome do original; senão None"""
+    for rendition in RENDITIONS:
+        suffix = f".{rendition}{RENDITION_SUFFIX}"
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return None
+
+def rendition_urls(photo_url: str) -> Dict[str, str]:
+    """URLs das versões reduzidas de uma foto (campos <versão>_url de PhotoRead)"""
+    return {f"{rendition}_url": rendition_filename(photo_url, rendition) for rendition in RENDITIONS}
+
+def generate_renditions(source_path: str):
+    """Gera as versões reduzidas de uma imagem (executado no pool de processos)"""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for rendition, size in RENDITIONS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            target_path = rendition_filename(source_path, rendition)
+            temp_path = f"{target_path}.tmp"
+            resized.save(temp_path, format="JPEG", quality=85, optimize=True)
+            os.replace(temp_path, target_path)
+
+def _get_thumbnail_pool() -> ProcessPoolExecutor:
+    """Cria o pool de processos das miniaturas sob demanda"""
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is None:
+            _thumbnail_pool = ProcessPoolExecutor(
+                max_workers=THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _thumbnail_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """Descarta o pool quebrado (ex.: worker morto por falta de memória); o próximo envio cria outro"""
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is pool:
+            _thumbnail_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _on_renditions_done(pool: ProcessPoolExecutor, future):
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.warning("Falha ao gerar miniaturas: %s", future.exception())
+    if isinstance(future.exception(), BrokenProcessPool):
+        _discard_broken_pool(pool)
+
+def missing_renditions(source_path: str) -> bool:
+    """True se alguma versão reduzida da foto ainda não existe"""
+    return any(not os.path.exists(rendition_filename(source_path, rendition)) for rendition in RENDITIONS)
+
+def schedule_renditions(source_path: str):
+    """Agenda a geração das versões reduzidas que faltam, sem bloquear a requisição
+    
+    Nunca lança: a foto já está salva e é servida no original enquanto as miniaturas não existem.
+    Com o pool quebrado, ele é recriado e o envio repetido uma vez.
+    """
+    if Image is None or not missing_renditions(source_path):
+        return
+    for attempt in range(2):
+        pool = _get_thumbnail_pool()
+        try:
+            future = pool.submit(generate_renditions, source_path)
+        except BrokenProcessPool:
+            _discard_broken_pool(pool)
+            continue
+        except Exception:
+            logger.exception("Falha ao agendar miniaturas de %s", source_path)
+            return
+        future.add_done_callback(lambda done: _on_renditions_done(pool, done))
+        return
+    logger.warning("Pool de miniaturas indisponível; miniaturas de %s não agendadas", source_path)
+
+def remove_renditions(source_path: str):
+    """Remove as versões reduzidas de uma foto"""
+    for rendition in RENDITIONS:
+        path = rendition_filename(source_path, rendition)
+        if os.path.exists(path):
+            os.remove(path)
+
+def shutdown_thumbnail_pool():
+    """Encerra o pool de processos das miniaturas"""
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is not None:
+            _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+            _thumbnail_pool = None
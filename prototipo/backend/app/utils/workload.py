@@ -0,0 +1,177 @@
+import os
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, func, and_
+
+from ..models.auth import users_table
+from ..models.orders import service_orders_table
+from .order_events import order_event_broker
+
+# Ordens que contam como carga de trabalho do técnico
+OPEN_ORDER_STATUSES = ("open", "in_progress")
+TECHNICIAN_ROLE = "tecnico"
+# Recarga periódica a partir do banco (limita a deriva se eventos forem perdidos)
+WORKLOAD_RESEED_SECONDS = float(os.getenv("WORKLOAD_RESEED_SECONDS", "300"))
+
+def select_technician_loads():
+    """SELECT (id, ordens abertas) de cada técnico ativo, inclusive os sem nenhuma ordem"""
+    return select(
+        users_table.c.id,
+        func.count(service_orders_table.c.id)
+    ).select_from(
+        users_table.outerjoin(
+            service_orders_table,
+            and_(
+                service_orders_table.c.user_id == users_table.c.id,
+                service_orders_table.c.status.in_(OPEN_ORDER_STATUSES)
+            )
+        )
+    ).where(
+        users_table.c.is_active == True,
+        users_table.c.role == TECHNICIAN_ROLE
+    ).group_by(users_table.c.id)
+
+def _open_assignment(status: Optional[str], user_id: Optional[int]) -> Optional[int]:
+    """Técnico para quem a ordem conta como carga (None se a ordem não está aberta)"""
+    return user_id if status in OPEN_ORDER_STATUSES else None
+
+class TechnicianWorkload:
+    """Carga de trabalho (ordens abertas) dos técnicos ativos em um heap de prioridade
+    
+    Semeada por agregação sobre service_orders e atualizada a cada atribuição ou mudança
+    de status pelos eventos de ordem (initdb/11), inclusive as feitas por outros workers.
+    Cada alteração empilha uma nova entrada; as desatualizadas são descartadas na leitura.
+    
+    Atribuições em lote deste processo são aplicadas logo após o commit (o próximo lote
+    não pode esperar pelo evento); o evento correspondente, quando chega, é ignorado.
+    """
+
+    def __init__(self):
+        self._loads: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []  # (carga, id do técnico)
+        # order_id -> (técnico, estado): 'pending' antes do commit, 'event' se o evento chegou
+        # antes da confirmação local, 'local' se já aplicada localmente (evento será ignorado)
+        self._expected: Dict[int, Tuple[int, str]] = {}
+        self._seeded_at: Optional[float] = None
+        self._seed_key = None
+        self._lock = threading.Lock()
+
+    def is_stale(self, seed_key) -> bool:
+        """True se nunca foi semeada, expirou ou o conjunto de técnicos mudou (seed_key)"""
+        with self._lock:
+            return (
+                self._seeded_at is None
+                or self._seed_key != seed_key
+                or time.monotonic() - self._seeded_at > WORKLOAD_RESEED_SECONDS
+            )
+
+    def seed(self, loads: Dict[int, int], seed_key):
+        with self._lock:
+            self._loads = dict(loads)
+            self._heap = [(load, technician_id) for technician_id, load in self._loads.items()]
+            heapq.heapify(self._heap)
+            self._seeded_at = time.monotonic()
+            self._seed_key = seed_key
+            self._expected.clear()
+
+    def invalidate(self):
+        """Força nova agregação na próxima leitura"""
+        with self._lock:
+            self._seeded_at = None
+            self._expected.clear()
+
+    def expect_assignments(self, assignments: Dict[int, int]):
+        """Registra atribuições (order_id -> técnico) de ordens abertas antes do commit"""
+        with self._lock:
+            for order_id, technician_id in assignments.items():
+                self._expected[order_id] = (technician_id, "pending")
+
+    def confirm_assignments(self, assignments: Dict[int, int], previous: Optional[Dict[int, int]] = None):
+        """Após o commit: aplica as atribuições cujo evento ainda não chegou
+        
+        previous (order_id -> técnico anterior) é descontado junto, para reatribuições de
+        ordens que já contavam na carga de outro técnico.
+        """
+        previous = previous or {}
+        with self._lock:
+            for order_id, technician_id in assignments.items():
+                expected = self._expected.get(order_id)
+                if expected == (technician_id, "pending"):
+                    self._adjust(previous.get(order_id), -1)
+                    self._adjust(technician_id, 1)
+                    self._expected[order_id] = (technician_id, "local")
+                elif expected is not None:
+                    del self._expected[order_id]
+
+    def discard_assignments(self, assignments: Dict[int, int]):
+        """Rollback: as atribuições registradas não ocorreram"""
+        with self._lock:
+            for order_id in assignments:
+                self._expected.pop(order_id, None)
+
+    def _adjust(self, technician_id: Optional[int], delta: int):
+        if technician_id not in self._loads:
+            return  # não é técnico ativo
+        load = max(self._loads[technician_id] + delta, 0)
+        self._loads[technician_id] = load
+        heapq.heappush(self._heap, (load, technician_id))
+        # Compacta quando as entradas desatualizadas dominam o heap
+        if len(self._heap) > 4 * len(self._loads) + 64:
+            self._heap = [(load, technician_id) for technician_id, load in self._loads.items()]
+            heapq.heapify(self._heap)
+
+    def apply_event(self, event: dict):
+        """Aplica um evento de order_events (executado na thread do listener)"""
+        before = None
+        after = None
+        if event["type"] != "created":
+            before = _open_assignment(
+                event.get("previous_status", event.get("status")),
+                event.get("previous_user_id", event.get("user_id"))
+            )
+        if event["type"] != "deleted":
+            after = _open_assignment(event.get("status"), event.get("user_id"))
+        if before == after:
+            return
+        with self._lock:
+            expected = self._expected.get(event["order_id"])
+            if expected and event["type"] == "assigned" and expected[0] == event.get("user_id"):
+                if expected[1] == "local":
+                    del self._expected[event["order_id"]]
+                    return  # já aplicada por confirm_assignments
+                self._expected[event["order_id"]] = (expected[0], "event")
+            self._adjust(before, -1)
+            self._adjust(after, 1)
+
+    def least_loaded(self) -> Optional[int]:
+        """Técnico ativo com menos ordens abertas (menor id no empate)"""
+        with self._lock:
+            while self._heap:
+                load, technician_id = self._heap[0]
+                if self._loads.get(technician_id) == load:
+                    return technician_id
+                heapq.heappop(self._heap)
+        return None
+
+    def snapshot(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._loads)
+
+technician_workload = TechnicianWorkload()
+
+def start_workload_tracking():
+    """Passa a acompanhar os eventos de ordem (chamado no startup da aplicação)"""
+    order_event_broker.add_consumer(technician_workload.apply_event, on_connect=technician_workload.invalidate)
+
+def plan_assignments(order_ids: List[int], loads: Dict[int, int]) -> Dict[int, int]:
+    """Distribui as ordens, uma a uma, ao técnico menos carregado no momento (order_id -> técnico)"""
+    heap = [(load, technician_id) for technician_id, load in loads.items()]
+    heapq.heapify(heap)
+    assignments = {}
+    for order_id in order_ids:
+        load, technician_id = heapq.heappop(heap)
+        assignments[order_id] = technician_id
+        heapq.heappush(heap, (load + 1, technician_id))
+    return assignments
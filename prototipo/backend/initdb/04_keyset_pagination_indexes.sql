@@ -0,0 +1,17 @@
+-- Índices para paginação por cursor (keyset) em service_orders
+-- created_at faz parte da chave do cursor: NULL quebraria a comparação (created_at, id) < (...)
+-- e o cursor (não há valor a codificar). Preenche as linhas antigas e passa a exigir valor.
+UPDATE service_orders SET created_at = coalesce(updated_at, now()) WHERE created_at IS NULL;
+ALTER TABLE service_orders
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN created_at SET NOT NULL;
+
+-- A listagem paginada ordena por (created_at DESC, id DESC) e filtra opcionalmente por status ou técnico
+CREATE INDEX IF NOT EXISTS idx_service_orders_created_at_id
+    ON service_orders (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_service_orders_status_created_at_id
+    ON service_orders (status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_service_orders_user_id_created_at_id
+    ON service_orders (user_id, created_at DESC, id DESC);
@@ -0,0 +1,27 @@
+-- Índices de desempenho para o esquema de ordens de serviço
+-- Criados com CONCURRENTLY para não bloquear escritas em bancos já populados
+-- (cada comando roda fora de transação; não executar este arquivo com psql --single-transaction)
+--
+-- Filtros por status, técnico (user_id) e ordenação por created_at em service_orders
+-- já são atendidos pelos índices compostos de 04_keyset_pagination_indexes.sql,
+-- cujas colunas iniciais são status, user_id e created_at.
+
+-- Fotos de uma OS, ordenadas pela data de envio (get_order, get_order_photos)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_os_photos_service_order_uploaded_at
+    ON os_photos (service_order_id, uploaded_at DESC);
+
+-- Respostas de checklist de uma OS
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_os_checklist_responses_service_order_id
+    ON os_checklist_responses (service_order_id);
+
+-- Itens de um checklist
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_checklist_items_checklist_id
+    ON checklist_items (checklist_id);
+
+-- Equipamentos de um cliente (list_equipments?client_id=)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipments_client_id
+    ON equipments (client_id);
+
+-- Limpeza e verificação de expiração de tokens
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_tokens_expires_at
+    ON auth_tokens (expires_at);
@@ -0,0 +1,6 @@
+-- Armazenamento de fotos endereçado por conteúdo (SHA-256)
+-- Fotos com o mesmo conteúdo compartilham o arquivo e a photo_url; a contagem de
+-- referências feita em delete_photo consulta os_photos por photo_url.
+-- (CONCURRENTLY: executar fora de transação)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_os_photos_photo_url
+    ON os_photos (photo_url);
@@ -0,0 +1,26 @@
+-- Uma resposta por item de checklist em cada OS
+-- Necessário para o upsert de save_checklist_responses (ON CONFLICT em
+-- service_order_id, checklist_item_id).
+
+-- Remove respostas duplicadas deixadas pelo antigo delete-then-insert, mantendo a mais recente
+DELETE FROM os_checklist_responses older
+USING os_checklist_responses newer
+WHERE older.service_order_id = newer.service_order_id
+  AND older.checklist_item_id = newer.checklist_item_id
+  AND older.id < newer.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_os_checklist_responses_order_item'
+    ) THEN
+        ALTER TABLE os_checklist_responses
+            ADD CONSTRAINT uq_os_checklist_responses_order_item
+            UNIQUE (service_order_id, checklist_item_id);
+    END IF;
+END
+$$;
+
+-- O índice único já atende buscas por service_order_id (coluna inicial);
+-- o índice simples de 05_performance_indexes.sql só encareceria as escritas
+DROP INDEX IF EXISTS idx_os_checklist_responses_service_order_id;
@@ -0,0 +1,16 @@
+-- Busca textual em service_orders (GET /orders/search/)
+-- Vetor gerado pelo próprio banco a partir de título (peso A), descrição (B) e
+-- atividades realizadas (C), com dicionário português (stemming e stopwords).
+-- Atenção: adicionar a coluna STORED reescreve a tabela; em bases grandes, aplicar
+-- em janela de manutenção.
+ALTER TABLE service_orders
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('portuguese', coalesce(activities_description, '')), 'C')
+    ) STORED;
+
+-- (CONCURRENTLY: executar fora de transação)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_orders_search_vector
+    ON service_orders USING GIN (search_vector);
@@ -0,0 +1,87 @@
+-- Contadores de ordens de serviço por status, técnico e cliente (GET /orders/dashboard/)
+-- Mantidos por trigger a cada escrita em service_orders; a leitura do dashboard não
+-- depende do tamanho de service_orders. service_order_counts_reconcile() recalcula
+-- tudo e corrige divergências (executado periodicamente pela API).
+-- (Os triggers por linha abaixo são substituídos por triggers de statement em
+-- 14_service_order_counts_statement_triggers.sql.)
+CREATE TABLE IF NOT EXISTS service_order_counts (
+    dimension VARCHAR(20) NOT NULL,     -- 'status', 'user' ou 'client'
+    dimension_key TEXT NOT NULL,        -- status ou id (como texto) do técnico/cliente
+    order_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, dimension_key)
+);
+
+CREATE OR REPLACE FUNCTION service_order_counts_bump(p_dimension TEXT, p_key TEXT, p_delta INT)
+RETURNS void LANGUAGE sql AS $$
+    INSERT INTO service_order_counts (dimension, dimension_key, order_count)
+    SELECT p_dimension, p_key, p_delta
+    WHERE p_key IS NOT NULL
+    ON CONFLICT (dimension, dimension_key)
+    DO UPDATE SET order_count = service_order_counts.order_count + EXCLUDED.order_count;
+$$;
+
+CREATE OR REPLACE FUNCTION service_order_counts_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM service_order_counts_bump('status', OLD.status, -1);
+        PERFORM service_order_counts_bump('user', OLD.user_id::text, -1);
+        PERFORM service_order_counts_bump('client', OLD.client_id::text, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM service_order_counts_bump('status', NEW.status, 1);
+        PERFORM service_order_counts_bump('user', NEW.user_id::text, 1);
+        PERFORM service_order_counts_bump('client', NEW.client_id::text, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_order_counts_insert_delete ON service_orders;
+CREATE TRIGGER trg_service_order_counts_insert_delete
+    AFTER INSERT OR DELETE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION service_order_counts_trigger();
+
+-- Alterações de título/descrição não tocam nos contadores
+DROP TRIGGER IF EXISTS trg_service_order_counts_update ON service_orders;
+CREATE TRIGGER trg_service_order_counts_update
+    AFTER UPDATE OF status, user_id, client_id ON service_orders
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.user_id IS DISTINCT FROM NEW.user_id
+          OR OLD.client_id IS DISTINCT FROM NEW.client_id)
+    EXECUTE FUNCTION service_order_counts_trigger();
+
+-- Recalcula os contadores a partir de service_orders; retorna quantas linhas corrigiu.
+-- (Substituída por 13_service_order_counts_reconcile_online.sql, que não bloqueia escritas.)
+-- O lock SHARE impede escritas em service_orders durante a contagem (leituras seguem
+-- normalmente), para que nenhum incremento concorrente seja sobrescrito.
+CREATE OR REPLACE FUNCTION service_order_counts_reconcile()
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    corrected integer;
+BEGIN
+    LOCK TABLE service_orders IN SHARE MODE;
+    
+    WITH actual AS (
+        SELECT 'status'::varchar AS dimension, status AS dimension_key, count(*) AS order_count
+        FROM service_orders WHERE status IS NOT NULL GROUP BY status
+        UNION ALL
+        SELECT 'user', user_id::text, count(*) FROM service_orders GROUP BY user_id
+        UNION ALL
+        SELECT 'client', client_id::text, count(*) FROM service_orders GROUP BY client_id
+    )
+    INSERT INTO service_order_counts (dimension, dimension_key, order_count)
+    SELECT dimension, dimension_key, coalesce(actual.order_count, 0)
+    FROM actual FULL JOIN service_order_counts stored USING (dimension, dimension_key)
+    WHERE stored.order_count IS DISTINCT FROM coalesce(actual.order_count, 0)
+    ON CONFLICT (dimension, dimension_key)
+    DO UPDATE SET order_count = EXCLUDED.order_count;
+    
+    GET DIAGNOSTICS corrected = ROW_COUNT;
+    RETURN corrected;
+END;
+$$;
+
+-- Carga inicial
+SELECT service_order_counts_reconcile();
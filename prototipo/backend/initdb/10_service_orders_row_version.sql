@@ -0,0 +1,17 @@
+-- Versão da linha de service_orders: base das ETags de GET /orders/{id} e das
+-- verificações If-Match em update_order / assign_technician.
+-- Incrementada por trigger em qualquer UPDATE, inclusive os que não passam pela API.
+ALTER TABLE service_orders ADD COLUMN IF NOT EXISTS row_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION service_orders_bump_row_version()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.row_version := OLD.row_version + 1;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_orders_row_version ON service_orders;
+CREATE TRIGGER trg_service_orders_row_version
+    BEFORE UPDATE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION service_orders_bump_row_version();
@@ -0,0 +1,43 @@
+-- Eventos de ordens de serviço para o fluxo SSE (GET /orders/events/)
+-- Toda escrita em service_orders publica um NOTIFY em order_events, entregue
+-- apenas após o commit. Os valores anteriores (previous_*) permitem que clientes
+-- filtrados por status ou técnico saibam quando uma ordem deixa o filtro.
+CREATE OR REPLACE FUNCTION service_orders_notify_event()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    event_type TEXT;
+    payload JSON;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        event_type := 'created';
+    ELSIF TG_OP = 'DELETE' THEN
+        event_type := 'deleted';
+    ELSIF OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+        event_type := 'assigned';
+    ELSE
+        event_type := 'updated';
+    END IF;
+    
+    IF TG_OP = 'DELETE' THEN
+        payload := json_build_object(
+            'type', event_type, 'order_id', OLD.id,
+            'status', OLD.status, 'user_id', OLD.user_id
+        );
+    ELSE
+        payload := json_build_object(
+            'type', event_type, 'order_id', NEW.id,
+            'status', NEW.status, 'user_id', NEW.user_id, 'row_version', NEW.row_version,
+            'previous_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+            'previous_user_id', CASE WHEN TG_OP = 'UPDATE' THEN OLD.user_id END
+        );
+    END IF;
+    
+    PERFORM pg_notify('order_events', payload::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_orders_notify_event ON service_orders;
+CREATE TRIGGER trg_service_orders_notify_event
+    AFTER INSERT OR UPDATE OR DELETE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION service_orders_notify_event();
@@ -0,0 +1,138 @@
+-- Sincronização incremental dos aplicativos dos técnicos (GET /orders/sync/)
+-- updated_at (UTC, relógio do banco) é mantido por trigger em service_orders,
+-- os_checklist_responses e os_photos; exclusões ficam registradas em sync_tombstones.
+-- O cliente envia a marca d'água da última sincronização e recebe apenas o que mudou.
+
+ALTER TABLE os_checklist_responses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE os_photos ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+-- Linhas existentes: data da última alteração conhecida
+UPDATE os_checklist_responses SET updated_at = coalesce(responded_at, timezone('UTC', now())) WHERE updated_at IS NULL;
+UPDATE os_photos SET updated_at = coalesce(uploaded_at, timezone('UTC', now())) WHERE updated_at IS NULL;
+UPDATE service_orders SET updated_at = coalesce(created_at, timezone('UTC', now())) WHERE updated_at IS NULL;
+
+ALTER TABLE os_checklist_responses
+    ALTER COLUMN updated_at SET DEFAULT timezone('UTC', now()),
+    ALTER COLUMN updated_at SET NOT NULL;
+ALTER TABLE os_photos
+    ALTER COLUMN updated_at SET DEFAULT timezone('UTC', now()),
+    ALTER COLUMN updated_at SET NOT NULL;
+
+-- clock_timestamp (e não now): o instante da escrita, não o início da transação.
+-- Transações longas ainda podem confirmar linhas com updated_at anterior à marca
+-- d'água entregue a um cliente; a janela de sobreposição da API cobre esses casos.
+CREATE OR REPLACE FUNCTION sync_touch_updated_at()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := timezone('UTC', clock_timestamp());
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_orders_updated_at ON service_orders;
+CREATE TRIGGER trg_service_orders_updated_at
+    BEFORE INSERT OR UPDATE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_os_checklist_responses_updated_at ON os_checklist_responses;
+CREATE TRIGGER trg_os_checklist_responses_updated_at
+    BEFORE INSERT OR UPDATE ON os_checklist_responses
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_os_photos_updated_at ON os_photos;
+CREATE TRIGGER trg_os_photos_updated_at
+    BEFORE INSERT OR UPDATE ON os_photos
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+
+-- Registro de exclusões. user_id é o técnico da OS no momento da exclusão, para que
+-- a sincronização filtrada por técnico receba as exclusões que lhe dizem respeito.
+-- reason = 'reassigned': a OS saiu da carteira do técnico (user_id anterior).
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(30) NOT NULL,        -- 'service_order', 'checklist_response' ou 'photo'
+    entity_id INT NOT NULL,
+    service_order_id INT NOT NULL,
+    user_id INT,
+    reason VARCHAR(20) NOT NULL DEFAULT 'deleted',
+    deleted_at TIMESTAMP NOT NULL DEFAULT timezone('UTC', clock_timestamp())
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at
+    ON sync_tombstones (deleted_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user_id_deleted_at
+    ON sync_tombstones (user_id, deleted_at);
+
+CREATE OR REPLACE FUNCTION sync_record_tombstone()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'service_orders' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, service_order_id, user_id)
+        VALUES ('service_order', OLD.id, OLD.id, OLD.user_id);
+    ELSE
+        INSERT INTO sync_tombstones (entity, entity_id, service_order_id, user_id)
+        SELECT CASE TG_TABLE_NAME WHEN 'os_photos' THEN 'photo' ELSE 'checklist_response' END,
+               OLD.id, OLD.service_order_id,
+               (SELECT user_id FROM service_orders WHERE id = OLD.service_order_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_orders_tombstone ON service_orders;
+CREATE TRIGGER trg_service_orders_tombstone
+    AFTER DELETE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION sync_record_tombstone();
+
+DROP TRIGGER IF EXISTS trg_os_checklist_responses_tombstone ON os_checklist_responses;
+CREATE TRIGGER trg_os_checklist_responses_tombstone
+    AFTER DELETE ON os_checklist_responses
+    FOR EACH ROW EXECUTE FUNCTION sync_record_tombstone();
+
+DROP TRIGGER IF EXISTS trg_os_photos_tombstone ON os_photos;
+CREATE TRIGGER trg_os_photos_tombstone
+    AFTER DELETE ON os_photos
+    FOR EACH ROW EXECUTE FUNCTION sync_record_tombstone();
+
+-- Reatribuição: o técnico anterior recebe a OS como removida e as respostas e fotos
+-- são marcadas como alteradas, para que o novo técnico as receba na próxima sincronização.
+CREATE OR REPLACE FUNCTION sync_order_reassigned()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO sync_tombstones (entity, entity_id, service_order_id, user_id, reason)
+    VALUES ('service_order', OLD.id, OLD.id, OLD.user_id, 'reassigned');
+    UPDATE os_checklist_responses SET updated_at = timezone('UTC', clock_timestamp()) WHERE service_order_id = NEW.id;
+    UPDATE os_photos SET updated_at = timezone('UTC', clock_timestamp()) WHERE service_order_id = NEW.id;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_orders_reassigned ON service_orders;
+CREATE TRIGGER trg_service_orders_reassigned
+    AFTER UPDATE OF user_id ON service_orders
+    FOR EACH ROW
+    WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE FUNCTION sync_order_reassigned();
+
+-- Remove exclusões mais antigas que a retenção; retorna quantas removeu.
+-- Clientes com marca d'água anterior à retenção recebem o estado completo (reset).
+CREATE OR REPLACE FUNCTION sync_tombstones_purge(retention INTERVAL)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    purged integer;
+BEGIN
+    DELETE FROM sync_tombstones WHERE deleted_at < timezone('UTC', clock_timestamp()) - retention;
+    GET DIAGNOSTICS purged = ROW_COUNT;
+    RETURN purged;
+END;
+$$;
+
+-- Alterações desde a marca d'água (geral e por técnico)
+-- (CONCURRENTLY: executar fora de transação)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_orders_updated_at
+    ON service_orders (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_orders_user_id_updated_at
+    ON service_orders (user_id, updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_os_checklist_responses_updated_at
+    ON os_checklist_responses (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_os_photos_updated_at
+    ON os_photos (updated_at);
@@ -0,0 +1,34 @@
+-- Reconciliação dos contadores do dashboard sem bloquear escritas em service_orders
+-- (substitui a versão de 09_service_order_counts.sql, que usava LOCK TABLE ... SHARE MODE).
+--
+-- Contagem real e contadores gravados são lidos no mesmo statement, logo no mesmo
+-- snapshot: a diferença entre eles é a divergência real naquele instante. Ela é aplicada
+-- como delta (order_count + diferença), preservando os incrementos que os triggers de
+-- transações concorrentes fizeram depois do snapshot.
+CREATE OR REPLACE FUNCTION service_order_counts_reconcile()
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    corrected integer;
+BEGIN
+    -- Duas reconciliações simultâneas aplicariam o mesmo delta duas vezes
+    PERFORM pg_advisory_xact_lock(hashtext('service_order_counts_reconcile'));
+    
+    WITH actual AS (
+        SELECT 'status'::varchar AS dimension, status AS dimension_key, count(*) AS order_count
+        FROM service_orders WHERE status IS NOT NULL GROUP BY status
+        UNION ALL
+        SELECT 'user', user_id::text, count(*) FROM service_orders GROUP BY user_id
+        UNION ALL
+        SELECT 'client', client_id::text, count(*) FROM service_orders GROUP BY client_id
+    )
+    INSERT INTO service_order_counts (dimension, dimension_key, order_count)
+    SELECT dimension, dimension_key, coalesce(actual.order_count, 0) - coalesce(stored.order_count, 0)
+    FROM actual FULL JOIN service_order_counts stored USING (dimension, dimension_key)
+    WHERE stored.order_count IS DISTINCT FROM coalesce(actual.order_count, 0)
+    ON CONFLICT (dimension, dimension_key)
+    DO UPDATE SET order_count = service_order_counts.order_count + EXCLUDED.order_count;
+    
+    GET DIAGNOSTICS corrected = ROW_COUNT;
+    RETURN corrected;
+END;
+$$;
@@ -0,0 +1,90 @@
+-- Contadores do dashboard mantidos por triggers de statement (substituem os triggers por
+-- linha de 09_service_order_counts.sql).
+--
+-- Com FOR EACH ROW, um INSERT/UPDATE/DELETE em massa fazia 3 upserts por linha, todos
+-- disputando as mesmas poucas linhas de service_order_counts (um status, um técnico...):
+-- cada upsert reescreve a mesma tupla e deixa uma versão morta para o próximo percorrer.
+-- Aqui as linhas afetadas chegam nas tabelas de transição (REFERENCING NEW/OLD TABLE),
+-- os deltas são somados por (dimension, dimension_key) e aplicados em um único
+-- INSERT ... ON CONFLICT DO UPDATE por statement.
+--
+-- Tabelas de transição não aceitam lista de colunas (UPDATE OF) nem triggers com mais de
+-- um evento, por isso há um trigger por evento; updates que não mudam status, técnico ou
+-- cliente somam zero e não escrevem nada (HAVING).
+
+-- Aplica os deltas das linhas (status, user_id, client_id, delta) de um statement
+CREATE OR REPLACE FUNCTION service_order_counts_apply(
+    p_status TEXT[], p_user_id INT[], p_client_id INT[], p_delta INT[]
+)
+RETURNS void LANGUAGE sql AS $$
+    WITH changes AS (
+        SELECT * FROM unnest(p_status, p_user_id, p_client_id, p_delta) AS c(status, user_id, client_id, delta)
+    ), deltas AS (
+        SELECT 'status'::varchar AS dimension, status AS dimension_key, delta FROM changes
+        UNION ALL
+        SELECT 'user', user_id::text, delta FROM changes
+        UNION ALL
+        SELECT 'client', client_id::text, delta FROM changes
+    )
+    INSERT INTO service_order_counts (dimension, dimension_key, order_count)
+    SELECT dimension, dimension_key, sum(delta)
+    FROM deltas
+    WHERE dimension_key IS NOT NULL
+    GROUP BY dimension, dimension_key
+    HAVING sum(delta) <> 0
+    -- Ordem fixa de travamento entre statements concorrentes (evita deadlock)
+    ORDER BY dimension, dimension_key
+    ON CONFLICT (dimension, dimension_key)
+    DO UPDATE SET order_count = service_order_counts.order_count + EXCLUDED.order_count;
+$$;
+
+CREATE OR REPLACE FUNCTION service_order_counts_statement_trigger()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- Cada consulta só é preparada no seu ramo: old_rows/new_rows existem conforme o evento
+    IF TG_OP = 'INSERT' THEN
+        PERFORM service_order_counts_apply(
+            array_agg(status), array_agg(user_id), array_agg(client_id), array_agg(1)
+        ) FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM service_order_counts_apply(
+            array_agg(status), array_agg(user_id), array_agg(client_id), array_agg(-1)
+        ) FROM old_rows;
+    ELSE
+        PERFORM service_order_counts_apply(
+            array_agg(status), array_agg(user_id), array_agg(client_id), array_agg(delta)
+        ) FROM (
+            SELECT status, user_id, client_id, -1 AS delta FROM old_rows
+            UNION ALL
+            SELECT status, user_id, client_id, 1 FROM new_rows
+        ) changes;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_service_order_counts_insert_delete ON service_orders;
+DROP TRIGGER IF EXISTS trg_service_order_counts_update ON service_orders;
+
+DROP TRIGGER IF EXISTS trg_service_order_counts_insert ON service_orders;
+CREATE TRIGGER trg_service_order_counts_insert
+    AFTER INSERT ON service_orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION service_order_counts_statement_trigger();
+
+DROP TRIGGER IF EXISTS trg_service_order_counts_delete ON service_orders;
+CREATE TRIGGER trg_service_order_counts_delete
+    AFTER DELETE ON service_orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION service_order_counts_statement_trigger();
+
+CREATE TRIGGER trg_service_order_counts_update
+    AFTER UPDATE ON service_orders
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION service_order_counts_statement_trigger();
+
+DROP FUNCTION IF EXISTS service_order_counts_trigger();
+DROP FUNCTION IF EXISTS service_order_counts_bump(TEXT, TEXT, INT);
+
+-- Deltas perdidos durante a troca dos triggers são corrigidos pela reconciliação
+SELECT service_order_counts_reconcile();
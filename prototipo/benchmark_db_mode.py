@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark do modo de banco da API (síncrono x assíncrono)
+
+Uso:
+  1. Suba a API com DB_ASYNC=false e rode: python benchmark_db_mode.py --label sync
+  2. Suba a API com DB_ASYNC=true e rode:  python benchmark_db_mode.py --label async
+Cada execução grava benchmark_<label>.json; quando os dois existem, imprime a comparação.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    RESET = '\033[0m'
+
+def print_info(msg: str):
+    print(f"{Colors.BLUE}[INFO] {msg}{Colors.RESET}")
+
+def print_error(msg: str):
+    print(f"{Colors.RED}[ERRO] {msg}{Colors.RESET}")
+
+def login(username: str, password: str) -> str:
+    """Faz login e retorna o token de acesso"""
+    response = requests.post(
+        f"{BASE_URL}/auth/login",
+        json={"username": username, "password": password},
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def run_scenario(path: str, token: str, concurrency: int, total: int) -> Dict:
+    """Dispara `total` requisições GET com `concurrency` clientes simultâneos"""
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies: List[float] = []
+    errors = 0
+
+    def worker(count: int):
+        nonlocal errors
+        session = requests.Session()
+        for _ in range(count):
+            start = time.perf_counter()
+            response = session.get(f"{BASE_URL}{path}", headers=headers, timeout=60)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    per_worker = max(total // concurrency, 1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker, per_worker)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1)
+    }
+
+def print_comparison(sync_results: Dict, async_results: Dict):
+    """Imprime a comparação entre as execuções sync e async"""
+    print("\n" + "="*78)
+    print(f"{'cenário':<32}{'sync req/s':>12}{'async req/s':>12}{'sync p95':>11}{'async p95':>11}")
+    print("="*78)
+    for scenario, sync_data in sync_results.items():
+        async_data = async_results.get(scenario)
+        if not async_data:
+            continue
+        print(
+            f"{scenario:<32}{sync_data['requests_per_second']:>12}{async_data['requests_per_second']:>12}"
+            f"{sync_data['p95_ms']:>9}ms{async_data['p95_ms']:>9}ms"
+        )
+    print("="*78 + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do modo de banco da API")
+    parser.add_argument("--label", required=True, choices=["sync", "async"], help="modo em que a API está rodando")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="123456")
+    args = parser.parse_args()
+
+    try:
+        token = login(args.username, args.password)
+    except Exception as e:
+        print_error(f"Não foi possível fazer login em {BASE_URL}: {e}")
+        sys.exit(1)
+
+    scenarios = {
+        "GET /orders/?limit=100": "/orders/?limit=100",
+        "GET /orders/paged/?limit=100": "/orders/paged/?limit=100",
+        "GET /orders/clients/": "/orders/clients/",
+        "GET /users/": "/users/",
+    }
+
+    results = {}
+    for name, path in scenarios.items():
+        print_info(f"[{args.label}] {name} ({args.concurrency} clientes simultâneos)...")
+        results[name] = run_scenario(path, token, args.concurrency, args.requests)
+        print(f"    {results[name]}")
+
+    with open(f"benchmark_{args.label}.json", "w") as output:
+        json.dump(results, output, indent=2)
+
+    other_label = "async" if args.label == "sync" else "sync"
+    if os.path.exists(f"benchmark_{other_label}.json"):
+        with open(f"benchmark_{other_label}.json") as other_file:
+            other = json.load(other_file)
+        if args.label == "sync":
+            print_comparison(results, other)
+        else:
+            print_comparison(other, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,931 @@
+#!/usr/bin/env python3
+"""
+Script de testes de desempenho do backend
+Executa a API em processo (TestClient) contra o banco do docker-compose
+e verifica propriedades de desempenho, como o número de consultas por requisição
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Banco exposto pelo docker-compose.backend.yml (porta externa 5441)
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5441")
+os.environ.setdefault("DB_USER", "postgres")
+os.environ.setdefault("DB_PASSWORD", "password")
+os.environ.setdefault("DB_NAME", "postgres")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="uploads-perf-"))
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, text, func
+
+from app.main import app
+from app.models.database import engine
+from app.models.orders import (
+    service_orders_table, equipments_table, checklist_items_table,
+    os_checklist_responses_table, os_photos_table,
+    service_orders_search_vector, SEARCH_CONFIG
+)
+from app.models.auth import auth_tokens_table
+from app.routers.orders import select_orders_with_relations
+from app.utils.security import token_cache, get_cached_user
+from app.utils.invalidation import invalidation_notify, start_invalidation_listener, stop_invalidation_listener
+from app.utils.reference_cache import reference_cache
+from app.utils.order_counts import reconcile_order_counts
+from app.utils.order_events import order_event_broker
+from app.utils.workload import plan_assignments
+from app.utils.pagination import decode_sync_token
+from app.utils.delta_sync import SYNC_OVERLAP_SECONDS
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    RESET = '\033[0m'
+
+def print_success(msg: str):
+    print(f"{Colors.GREEN}[OK] {msg}{Colors.RESET}")
+
+def print_error(msg: str):
+    print(f"{Colors.RED}[ERRO] {msg}{Colors.RESET}")
+
+def print_warning(msg: str):
+    print(f"{Colors.YELLOW}[AVISO] {msg}{Colors.RESET}")
+
+def print_info(msg: str):
+    print(f"{Colors.BLUE}[INFO] {msg}{Colors.RESET}")
+
+class QueryCounter:
+    """Conta os statements SQL executados pela engine"""
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+class CheckoutCounter:
+    """Conta as conexões retiradas do pool da engine"""
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(engine, "checkout", self._on_checkout)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "checkout", self._on_checkout)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.count += 1
+
+# Massa de dados para os testes de plano de execução (criada em transação e desfeita no final)
+SEED_LARGE_DATASET = [
+    """INSERT INTO users (username, password_hash, name, role)
+       SELECT 'perf_tech_' || g, 'x', 'Técnico ' || g, 'tecnico' FROM generate_series(1, 200) g""",
+    """INSERT INTO clients (name) SELECT 'Cliente perf ' || g FROM generate_series(1, 2000) g""",
+    """INSERT INTO equipments (client_id, type, serial_number)
+       SELECT c.id, 'Desktop', 'PERF-' || c.id FROM clients c WHERE c.name LIKE 'Cliente perf %'""",
+    """WITH e AS (SELECT array_agg(id ORDER BY id) AS ids, array_agg(client_id ORDER BY id) AS client_ids
+                FROM equipments WHERE serial_number LIKE 'PERF-%'),
+            u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE username LIKE 'perf_tech_%')
+       INSERT INTO service_orders (client_id, equipment_id, user_id, title, status, created_at)
+       SELECT e.client_ids[1 + g % 2000], e.ids[1 + g % 2000], u.ids[1 + g % 200], 'OS perf ' || g,
+              (ARRAY['open', 'in_progress', 'closed'])[1 + g % 3],
+              now() - (g || ' minutes')::interval
+       FROM generate_series(1, 200000) g, e, u""",
+    # Estatísticas novas invalidam os planos em cache da conexão (inclusive os das checagens de
+    # chave estrangeira, preparados quando service_orders tinha poucas linhas e que fariam
+    # Seq Scan por linha inserida em os_photos/os_checklist_responses)
+    "ANALYZE service_orders",
+    """INSERT INTO checklists (name) SELECT 'Checklist perf ' || g FROM generate_series(1, 500) g""",
+    """INSERT INTO checklist_items (checklist_id, description)
+       SELECT c.id, 'Item ' || g FROM checklists c, generate_series(1, 10) g WHERE c.name LIKE 'Checklist perf %'""",
+    """INSERT INTO os_photos (service_order_id, photo_url)
+       SELECT id, '/uploads/perf-' || id || '.jpg' FROM service_orders WHERE title LIKE 'OS perf %'""",
+    """INSERT INTO os_checklist_responses (service_order_id, checklist_item_id, is_checked)
+       SELECT so.id, (SELECT min(id) FROM checklist_items), true
+       FROM service_orders so WHERE so.title LIKE 'OS perf %'""",
+    """INSERT INTO auth_tokens (user_id, token, expires_at)
+       SELECT u.id, 'perf-token-' || g, now() + (g % 1000 || ' minutes')::interval
+       FROM generate_series(1, 100000) g, (SELECT min(id) AS id FROM users WHERE username LIKE 'perf_tech_%') u""",
+    "ANALYZE",
+]
+
+def find_seq_scans(plan: dict, relation: str) -> List[dict]:
+    """Retorna os nós Seq Scan sobre `relation` em um plano EXPLAIN (FORMAT JSON)"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == relation:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child, relation))
+    return found
+
+class PerformanceTester:
+    def __init__(self):
+        self.client = TestClient(app)
+        self.headers: Dict[str, str] = {}
+
+    def login(self, username: str = "admin", password: str = "123456") -> bool:
+        """Faz login e obtém token"""
+        response = self.client.post(
+            "/auth/login",
+            json={"username": username, "password": password}
+        )
+        if response.status_code != 200:
+            print_error(f"Falha no login: {response.status_code} - {response.text}")
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        print_success(f"Login realizado com sucesso (usuário: {username})")
+        return True
+
+    def ensure_orders(self, minimum: int = 5) -> bool:
+        """Garante uma quantidade mínima de ordens para os testes de listagem"""
+        orders = self.client.get("/orders/", params={"limit": 100}, headers=self.headers).json()
+        if len(orders) >= minimum:
+            return True
+
+        equipments = self.client.get("/orders/equipments/", headers=self.headers).json()
+        if not equipments:
+            print_error("Nenhum equipamento cadastrado para criar ordens de teste")
+            return False
+
+        equipment = equipments[0]
+        for index in range(minimum - len(orders)):
+            response = self.client.post(
+                "/orders/",
+                json={
+                    "title": f"Ordem de desempenho {index}",
+                    "client_id": equipment["client_id"],
+                    "equipment_id": equipment["id"]
+                },
+                headers=self.headers
+            )
+            if response.status_code != 200:
+                print_error(f"Falha ao criar ordem: {response.status_code} - {response.text}")
+                return False
+        return True
+
+    def count_queries(self, method: str, url: str, **kwargs) -> int:
+        """Executa uma requisição e retorna quantos statements SQL ela gerou"""
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        with QueryCounter() as counter:
+            response = self.client.request(method, url, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise AssertionError(f"{method} {url} retornou {response.status_code}: {response.text}")
+        return counter.count
+
+    def test_list_orders_query_count(self) -> bool:
+        """O número de consultas de GET /orders/ não pode depender do tamanho da página"""
+        print_info("Testando número de consultas da listagem de ordens...")
+        small_page = self.count_queries("GET", "/orders/", params={"limit": 1})
+        full_page = self.count_queries("GET", "/orders/", params={"limit": 100})
+        if small_page != full_page:
+            print_error(f"Listagem faz N+1: {small_page} consultas (1 ordem) x {full_page} (100 ordens)")
+            return False
+        print_success(f"Listagem de ordens com número constante de consultas ({full_page})")
+        return True
+
+    def test_one_connection_per_request(self) -> bool:
+        """Autenticação e rota devem compartilhar a mesma sessão (uma conexão por requisição)"""
+        print_info("Testando conexões usadas por requisição autenticada...")
+        # Sem cache de token, a autenticação também consulta o banco
+        token_cache.clear()
+        with CheckoutCounter() as counter:
+            response = self.client.get("/orders/", params={"limit": 1}, headers=self.headers)
+        if response.status_code != 200:
+            print_error(f"Falha ao listar ordens: {response.status_code} - {response.text}")
+            return False
+        if counter.count != 1:
+            print_error(f"Requisição autenticada usou {counter.count} conexões do pool")
+            return False
+        print_success("Requisição autenticada usa uma única conexão do pool")
+        return True
+
+    def test_cursor_pagination(self) -> bool:
+        """Percorre /orders/paged/ e verifica que nenhuma ordem se repete ou é perdida"""
+        print_info("Testando paginação por cursor...")
+        seen: List[int] = []
+        params = {"limit": 2}
+        while len(seen) < 20:
+            page = self.client.get("/orders/paged/", params=params, headers=self.headers).json()
+            seen.extend(order["id"] for order in page["items"])
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        expected = self.client.get("/orders/paged/", params={"limit": len(seen)}, headers=self.headers).json()
+        if seen != [order["id"] for order in expected["items"]]:
+            print_error("Paginação por cursor retornou ordens repetidas ou fora de ordem")
+            return False
+        print_success(f"Paginação por cursor consistente ({len(seen)} ordens)")
+        return True
+
+    def test_hot_queries_use_indexes(self) -> bool:
+        """Com uma base grande, as consultas críticas não podem fazer Seq Scan nas tabelas filtradas"""
+        print_info("Testando planos de execução das consultas críticas (massa de dados grande)...")
+        success = True
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            try:
+                for statement in SEED_LARGE_DATASET:
+                    conn.execute(text(statement))
+
+                sample = conn.execute(text(
+                    "SELECT id, user_id, client_id FROM service_orders WHERE title = 'OS perf 1000'"
+                )).first()
+                checklist_id = conn.execute(text(
+                    "SELECT min(id) FROM checklists WHERE name LIKE 'Checklist perf %'"
+                )).scalar()
+                newest_first = (service_orders_table.c.created_at.desc(), service_orders_table.c.id.desc())
+                search_query = func.websearch_to_tsquery(SEARCH_CONFIG, "1000")
+                search_condition = service_orders_search_vector.bool_op("@@")(search_query)
+                search_rank = func.ts_rank_cd(service_orders_search_vector, search_query)
+
+                hot_queries = [
+                    ("ordens por status", "service_orders",
+                     select_orders_with_relations().where(service_orders_table.c.status == "in_progress")
+                     .order_by(*newest_first).limit(100)),
+                    ("ordens por técnico", "service_orders",
+                     select_orders_with_relations().where(service_orders_table.c.user_id == sample.user_id)
+                     .order_by(*newest_first).limit(100)),
+                    ("ordens mais recentes", "service_orders",
+                     select_orders_with_relations().order_by(*newest_first).limit(100)),
+                    ("fotos da OS", "os_photos",
+                     select(os_photos_table).where(os_photos_table.c.service_order_id == sample.id)
+                     .order_by(os_photos_table.c.uploaded_at.desc())),
+                    ("respostas de checklist da OS", "os_checklist_responses",
+                     select(os_checklist_responses_table)
+                     .where(os_checklist_responses_table.c.service_order_id == sample.id)),
+                    ("itens do checklist", "checklist_items",
+                     select(checklist_items_table).where(checklist_items_table.c.checklist_id == checklist_id)),
+                    # Mesma ordenação de GET /orders/search/ (relevância): sem ORDER BY, o LIMIT
+                    # tornaria um Seq Scan que para cedo "mais barato" para termos raros
+                    ("busca textual", "service_orders",
+                     select_orders_with_relations().where(search_condition)
+                     .order_by(search_rank.desc(), service_orders_table.c.id.desc()).limit(51)),
+                    ("equipamentos do cliente", "equipments",
+                     select(equipments_table).where(equipments_table.c.client_id == sample.client_id)),
+                    ("tokens expirados", "auth_tokens",
+                     select(auth_tokens_table).where(auth_tokens_table.c.expires_at < text("now() - interval '1 day'"))),
+                ]
+
+                for name, relation, query in hot_queries:
+                    sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+                    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()[0]["Plan"]
+                    if find_seq_scans(plan, relation):
+                        print_error(f"Seq Scan em {relation} na consulta de {name}")
+                        success = False
+                    else:
+                        print_success(f"Consulta de {name} usa índice em {relation}")
+            finally:
+                transaction.rollback()
+        return success
+
+    def test_photo_deduplication(self) -> bool:
+        """Mesmo conteúdo enviado para duas ordens deve compartilhar o arquivo até a última remoção"""
+        print_info("Testando deduplicação de fotos...")
+        orders = self.client.get("/orders/", params={"limit": 2}, headers=self.headers).json()
+        content = os.urandom(4096)
+
+        photos = []
+        for order in orders[:2]:
+            response = self.client.post(
+                f"/orders/{order['id']}/photos",
+                files={"file": ("foto.jpg", content, "image/jpeg")},
+                headers=self.headers
+            )
+            if response.status_code != 200:
+                print_error(f"Falha no upload: {response.status_code} - {response.text}")
+                return False
+            photos.append(response.json())
+
+        if photos[0]["photo_url"] != photos[1]["photo_url"]:
+            print_error("Conteúdo idêntico gerou arquivos diferentes")
+            return False
+
+        file_url = f"/orders{photos[0]['photo_url']}"
+        self.client.delete(f"/orders/photos/{photos[0]['id']}", headers=self.headers)
+        if self.client.get(file_url).status_code != 200:
+            print_error("Arquivo removido enquanto ainda havia outra referência")
+            return False
+
+        self.client.delete(f"/orders/photos/{photos[1]['id']}", headers=self.headers)
+        if self.client.get(file_url).status_code != 404:
+            print_error("Arquivo não removido após a última referência")
+            return False
+        print_success("Fotos idênticas compartilham um único arquivo endereçado por conteúdo")
+        return True
+
+    def test_photo_http_cache(self) -> bool:
+        """Fotos devem ter validadores, cache imutável, 304 condicional e suporte a Range"""
+        print_info("Testando cache HTTP das fotos...")
+        order = self.client.get("/orders/", params={"limit": 1}, headers=self.headers).json()[0]
+        photo = self.client.post(
+            f"/orders/{order['id']}/photos",
+            files={"file": ("foto.jpg", os.urandom(4096), "image/jpeg")},
+            headers=self.headers
+        ).json()
+        file_url = f"/orders{photo['photo_url']}"
+
+        try:
+            response = self.client.get(file_url)
+            etag = response.headers.get("etag")
+            if not etag or "immutable" not in response.headers.get("cache-control", ""):
+                print_error(f"Cabeçalhos de cache ausentes: {dict(response.headers)}")
+                return False
+
+            if self.client.get(file_url, headers={"If-None-Match": etag}).status_code != 304:
+                print_error("If-None-Match com a ETag atual não retornou 304")
+                return False
+
+            partial = self.client.get(file_url, headers={"Range": "bytes=0-99"})
+            if partial.status_code != 206 or len(partial.content) != 100:
+                print_error(f"Range não atendido: {partial.status_code}, {len(partial.content)} bytes")
+                return False
+        finally:
+            self.client.delete(f"/orders/photos/{photo['id']}", headers=self.headers)
+
+        print_success("Fotos servidas com ETag, cache imutável, 304 e Range")
+        return True
+
+    def test_checklist_save_is_bulk(self) -> bool:
+        """Salvar respostas de checklist usa número constante de statements e preserva itens inalterados"""
+        print_info("Testando upsert em lote das respostas de checklist...")
+        checklists = self.client.get("/orders/checklists/", headers=self.headers).json()
+        items = [item["id"] for checklist in checklists for item in checklist["items"]]
+        order_id = self.client.get("/orders/", params={"limit": 1}, headers=self.headers).json()[0]["id"]
+        url = f"/orders/{order_id}/checklist-responses/"
+
+        def payload(checked_by_item: Dict[int, bool]) -> List[dict]:
+            return [
+                {"service_order_id": order_id, "checklist_item_id": item_id, "is_checked": checked}
+                for item_id, checked in checked_by_item.items()
+            ]
+
+        single = self.count_queries("POST", url, json=payload({items[0]: False}))
+        everything = self.count_queries("POST", url, json=payload({item_id: False for item_id in items}))
+        if single != everything:
+            print_error(f"Salvar checklist depende do número de itens: {single} x {everything} statements")
+            return False
+
+        before = {r["checklist_item_id"]: r["responded_at"] for r in self.client.get(url, headers=self.headers).json()}
+        flipped = {item_id: False for item_id in items}
+        flipped[items[0]] = True
+        self.client.post(url, json=payload(flipped), headers=self.headers)
+        after = {r["checklist_item_id"]: r["responded_at"] for r in self.client.get(url, headers=self.headers).json()}
+
+        self.client.post(url, json=[], headers=self.headers)
+        if any(after[item_id] != before[item_id] for item_id in items[1:]):
+            print_error("Itens não alterados tiveram responded_at reescrito")
+            return False
+        print_success(f"Checklist salvo com {everything} statements, sem reescrever itens inalterados")
+        return True
+
+    def test_checklist_reads_query_count(self) -> bool:
+        """Checklists e respostas são carregados com número constante de consultas"""
+        print_info("Testando número de consultas das rotas de checklist...")
+        reference_cache.bump("checklists")
+        before = self.count_queries("GET", "/orders/checklists/")
+
+        # Um checklist novo com vários itens não pode acrescentar consultas (e invalida o cache)
+        response = self.client.post("/orders/checklists/", json={"name": "Checklist de desempenho"}, headers=self.headers)
+        if response.status_code != 200:
+            print_error(f"Criação do checklist falhou: {response.status_code} {response.text}")
+            return False
+        checklist = response.json()
+        for index in range(5):
+            response = self.client.post(
+                f"/orders/checklists/{checklist['id']}/items/",
+                json={"checklist_id": checklist["id"], "description": f"Item {index}"},
+                headers=self.headers
+            )
+            if response.status_code != 200:
+                print_error(f"Criação do item {index} falhou: {response.status_code} {response.text}")
+                return False
+        after = self.count_queries("GET", "/orders/checklists/")
+        listed = self.client.get("/orders/checklists/", headers=self.headers).json()
+        if before != after:
+            print_error(f"Listagem de checklists faz N+1: {before} x {after} consultas")
+            return False
+        if not any(c["id"] == checklist["id"] and len(c["items"]) == 5 for c in listed):
+            print_error("Cache de checklists não foi invalidado pela criação de itens")
+            return False
+
+        cached = self.count_queries("GET", "/orders/checklists/")
+        if cached >= after:
+            print_error(f"Listagem de checklists não usou o cache ({cached} consultas)")
+            return False
+
+        order_id = self.client.get("/orders/", params={"limit": 1}, headers=self.headers).json()[0]["id"]
+        url = f"/orders/{order_id}/checklist-responses/"
+        items = [item["id"] for c in listed for item in c["items"]]
+        response = self.client.post(url, json=[
+            {"service_order_id": order_id, "checklist_item_id": items[0], "is_checked": True}
+        ], headers=self.headers)
+        if response.status_code != 200:
+            print_error(f"Gravação de respostas falhou: {response.status_code} {response.text}")
+            return False
+        single = self.count_queries("GET", url)
+        response = self.client.post(url, json=[
+            {"service_order_id": order_id, "checklist_item_id": item_id, "is_checked": True} for item_id in items
+        ], headers=self.headers)
+        if response.status_code != 200:
+            print_error(f"Gravação de respostas falhou: {response.status_code} {response.text}")
+            return False
+        many = self.count_queries("GET", url)
+        self.client.post(url, json=[], headers=self.headers)
+        if single != many:
+            print_error(f"Respostas de checklist fazem N+1: {single} x {many} consultas")
+            return False
+        print_success(f"Checklists ({after}) e respostas ({many}) com número constante de consultas")
+        return True
+
+    def test_reference_cache_etag(self) -> bool:
+        """Listas de referência revalidam por ETag sem consultar o banco e mudam após escritas"""
+        print_info("Testando cache de referência e ETag...")
+        reference_cache.clear()
+        first = self.client.get("/orders/clients/", headers=self.headers)
+        etag = first.headers.get("etag")
+        if first.status_code != 200 or not etag:
+            print_error(f"Listagem de clientes sem ETag: {first.status_code}")
+            return False
+
+        token_cache.clear()
+        self.client.get("/orders/clients/", headers=self.headers)  # autenticação volta ao cache de token
+        revalidation_queries = self.count_queries("GET", "/orders/clients/", headers={"If-None-Match": etag})
+        revalidated = self.client.get("/orders/clients/", headers={**self.headers, "If-None-Match": etag})
+        if revalidated.status_code != 304 or revalidation_queries != 0:
+            print_error(f"Revalidação retornou {revalidated.status_code} com {revalidation_queries} consultas")
+            return False
+
+        self.client.post(
+            "/orders/clients/",
+            json={"name": "Cliente de desempenho", "email": "cliente.perf@example.com"},
+            headers=self.headers
+        )
+        after_write = self.client.get("/orders/clients/", headers={**self.headers, "If-None-Match": etag})
+        if after_write.status_code != 200 or after_write.headers.get("etag") == etag:
+            print_error("Criar cliente não invalidou a lista em cache")
+            return False
+        print_success("Listas de referência servidas do cache, com 304 por ETag e invalidação nas escritas")
+        return True
+
+    def test_cross_worker_invalidation(self) -> bool:
+        """Eventos publicados por outro worker via NOTIFY devem esvaziar os caches deste processo"""
+        print_info("Testando invalidação entre workers (LISTEN/NOTIFY)...")
+        start_invalidation_listener()
+        try:
+            time.sleep(1)  # aguarda o LISTEN
+            token = self.headers["Authorization"].split(" ", 1)[1]
+            self.client.get("/orders/clients/", headers=self.headers)
+            version = reference_cache.version("clients")
+            if get_cached_user(token) is None:
+                print_error("Token não está no cache após requisição autenticada")
+                return False
+
+            # Simula a escrita de outro worker: NOTIFY entregue no commit
+            with engine.begin() as conn:
+                conn.execute(invalidation_notify(tables=["clients"], user_ids=[get_cached_user(token).id]))
+
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                if reference_cache.version("clients") > version and get_cached_user(token) is None:
+                    print_success("Evento de invalidação consumido pelo listener do worker")
+                    return True
+                time.sleep(0.05)
+            print_error("Listener não aplicou o evento de invalidação em 5s")
+            return False
+        finally:
+            stop_invalidation_listener()
+
+    def test_search_orders(self) -> bool:
+        """Busca textual encontra variações da palavra (stemming) e pagina sem repetir ordens"""
+        print_info("Testando busca textual de ordens...")
+        equipment = self.client.get("/orders/equipments/", headers=self.headers).json()[0]
+        created = []
+        for index in range(3):
+            response = self.client.post(
+                "/orders/",
+                json={
+                    "title": f"Manutenção zyxwq {index}",
+                    "description": "Limpeza e troca das ventoinhas",
+                    "client_id": equipment["client_id"],
+                    "equipment_id": equipment["id"]
+                },
+                headers=self.headers
+            )
+            created.append(response.json()["id"])
+
+        try:
+            stemmed = self.client.get("/orders/search/", params={"q": "ventoinha zyxwq"}, headers=self.headers).json()
+            if sorted(order["id"] for order in stemmed["items"]) != sorted(created):
+                print_error("Busca por 'ventoinha' não encontrou as ordens com 'ventoinhas'")
+                return False
+
+            for order in ("relevance", "recent"):
+                seen: List[int] = []
+                params = {"q": "zyxwq", "limit": 2, "order": order}
+                while True:
+                    page = self.client.get("/orders/search/", params=params, headers=self.headers).json()
+                    seen.extend(item["id"] for item in page["items"])
+                    if not page["next_cursor"]:
+                        break
+                    params["cursor"] = page["next_cursor"]
+                if sorted(seen) != sorted(created):
+                    print_error(f"Paginação da busca ({order}) retornou {seen}, esperado {created}")
+                    return False
+
+            # Relevâncias diferentes de 1.0 (descrição: peso B, atividades: peso C), com empates
+            # na fronteira das páginas
+            for index in range(5):
+                field = "description" if index < 3 else "activities_description"
+                response = self.client.post(
+                    "/orders/",
+                    json={
+                        "title": f"Revisão {index}",
+                        field: "Equipamento qxvzk revisado",
+                        "client_id": equipment["client_id"],
+                        "equipment_id": equipment["id"]
+                    },
+                    headers=self.headers
+                )
+                created.append(response.json()["id"])
+            expected = created[-5:]
+            seen = []
+            params = {"q": "qxvzk", "limit": 2, "order": "relevance"}
+            for _ in range(10):
+                page = self.client.get("/orders/search/", params=params, headers=self.headers).json()
+                seen.extend(item["id"] for item in page["items"])
+                if not page["next_cursor"]:
+                    break
+                params["cursor"] = page["next_cursor"]
+            if sorted(seen) != sorted(expected) or seen[:3] != sorted(expected[:3], reverse=True):
+                print_error(f"Paginação por relevância fracionária retornou {seen}, esperado {expected}")
+                return False
+        finally:
+            for order_id in created:
+                self.client.delete(f"/orders/{order_id}", headers=self.headers)
+
+        print_success("Busca textual com stemming e paginação por cursor")
+        return True
+
+    def test_export_orders(self) -> bool:
+        """Exportação NDJSON e CSV traz todas as ordens (com relacionamentos) respeitando os filtros"""
+        print_info("Testando exportação de ordens...")
+        with engine.connect() as conn:
+            total = conn.execute(select(func.count()).select_from(service_orders_table)).scalar()
+            open_orders = conn.execute(
+                select(func.count()).select_from(service_orders_table).where(service_orders_table.c.status == "open")
+            ).scalar()
+
+        with self.client.stream("GET", "/orders/export/", params={"format": "ndjson"}, headers=self.headers) as response:
+            orders = [json.loads(line) for line in response.iter_lines() if line]
+        if len(orders) != total or any("client" not in order for order in orders):
+            print_error(f"NDJSON exportou {len(orders)} ordens, esperado {total}")
+            return False
+
+        response = self.client.get("/orders/export/", params={"format": "csv", "status": "open"}, headers=self.headers)
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        if len(rows) != open_orders or any(row["status"] != "open" for row in rows):
+            print_error(f"CSV filtrado exportou {len(rows)} ordens, esperado {open_orders}")
+            return False
+        ndjson_dates = {order["id"]: order["created_at"] for order in orders}
+        if any(row["created_at"] != ndjson_dates[int(row["id"])] for row in rows):
+            print_error("CSV e NDJSON exportam datas em formatos diferentes")
+            return False
+        print_success(f"Exportação em streaming: {total} ordens (NDJSON), {open_orders} abertas (CSV)")
+        return True
+
+    def test_dashboard_counters(self) -> bool:
+        """Contadores do dashboard acompanham criação/exclusão de ordens e batem com a contagem real"""
+        print_info("Testando contadores do dashboard...")
+        with engine.connect() as conn:
+            actual = dict(conn.execute(
+                select(service_orders_table.c.status, func.count()).group_by(service_orders_table.c.status)
+            ).fetchall())
+        before = self.client.get("/orders/dashboard/", headers=self.headers).json()
+        if before["by_status"] != {status: count for status, count in actual.items() if status}:
+            print_error(f"Dashboard {before['by_status']} diverge da contagem real {actual}")
+            return False
+
+        equipment = self.client.get("/orders/equipments/", headers=self.headers).json()[0]
+        order = self.client.post(
+            "/orders/",
+            json={"title": "Ordem do dashboard", "client_id": equipment["client_id"], "equipment_id": equipment["id"]},
+            headers=self.headers
+        ).json()
+        during = self.client.get("/orders/dashboard/", headers=self.headers).json()
+        self.client.delete(f"/orders/{order['id']}", headers=self.headers)
+        after = self.client.get("/orders/dashboard/", headers=self.headers).json()
+
+        if during["total"] != before["total"] + 1 or after["total"] != before["total"]:
+            print_error(f"Totais do dashboard: {before['total']} -> {during['total']} -> {after['total']}")
+            return False
+        corrected = reconcile_order_counts()
+        if corrected:
+            print_error(f"Reconciliação encontrou {corrected} contadores divergentes")
+            return False
+        print_success("Contadores do dashboard mantidos por trigger e consistentes com a reconciliação")
+        return True
+
+    def test_order_conditional_requests(self) -> bool:
+        """GET condicional responde 304 e escritas com If-Match desatualizado recebem 412"""
+        print_info("Testando ETag/If-None-Match/If-Match das ordens...")
+        order_id = self.client.get("/orders/", params={"limit": 1}, headers=self.headers).json()[0]["id"]
+        url = f"/orders/{order_id}"
+        etag = self.client.get(url, headers=self.headers).headers.get("etag")
+        if not etag:
+            print_error("GET da ordem sem ETag")
+            return False
+
+        not_modified_queries = self.count_queries("GET", url, headers={"If-None-Match": etag})
+        if self.client.get(url, headers={**self.headers, "If-None-Match": etag}).status_code != 304:
+            print_error("If-None-Match com a ETag atual não retornou 304")
+            return False
+
+        updated = self.client.put(url, json={"description": "Atualizada com If-Match"}, headers={**self.headers, "If-Match": etag})
+        if updated.status_code != 200 or updated.headers.get("etag") in (None, etag):
+            print_error(f"Atualização com If-Match atual falhou: {updated.status_code}")
+            return False
+
+        stale = self.client.put(url, json={"description": "Sobrescrita"}, headers={**self.headers, "If-Match": etag})
+        if stale.status_code != 412:
+            print_error(f"Atualização com If-Match desatualizado retornou {stale.status_code}, esperado 412")
+            return False
+        if self.client.get(url, headers={**self.headers, "If-None-Match": etag}).status_code != 200:
+            print_error("GET condicional com ETag antiga não retornou a nova versão")
+            return False
+
+        # If-Match com lista e validador fraco (ex.: ETag enfraquecida por compressão em proxy)
+        current = self.client.get(url, headers=self.headers)
+        weak = self.client.put(
+            url, json={"description": "Atualizada com W/"},
+            headers={**self.headers, "If-Match": f'"o0v1", W/{current.headers["etag"]}'}
+        )
+        if weak.status_code != 200:
+            print_error(f"If-Match com lista e W/ retornou {weak.status_code}, esperado 200")
+            return False
+
+        # Renomear o técnico muda a representação (dados aninhados) sem alterar a ordem
+        etag = weak.headers["etag"]
+        technician = current.json()["user"]
+        self.client.put(f"/users/{technician['id']}", json={"name": "Técnico renomeado"}, headers=self.headers)
+        try:
+            renamed = self.client.get(url, headers={**self.headers, "If-None-Match": etag})
+        finally:
+            self.client.put(f"/users/{technician['id']}", json={"name": technician["name"]}, headers=self.headers)
+        if renamed.status_code != 200 or renamed.json()["user"]["name"] != "Técnico renomeado":
+            print_error(f"GET após renomear o técnico retornou {renamed.status_code}, esperado 200")
+            return False
+        print_success(f"Ordens com 304 ({not_modified_queries} consulta) e 412 para escritas concorrentes")
+        return True
+
+    def test_order_events(self) -> bool:
+        """Criação, atribuição e exclusão de ordens chegam aos assinantes do fluxo de eventos"""
+        print_info("Testando fluxo de eventos de ordens (LISTEN/NOTIFY)...")
+        equipment = self.client.get("/orders/equipments/", headers=self.headers).json()[0]
+        # Técnico próprio: a ordem é criada pelo administrador, e atribuí-la a ele mesmo seria
+        # só um "updated", não um "assigned"
+        technician = self.client.post(
+            "/users/",
+            json={"username": f"perf_events_{int(time.time())}", "password": "123456", "role": "tecnico"},
+            headers=self.headers
+        ).json()
+        technician_id = technician["id"]
+
+        async def collect() -> List[dict]:
+            subscription = order_event_broker.subscribe()
+            await asyncio.sleep(1)  # listener conectando
+            try:
+                order = self.client.post(
+                    "/orders/",
+                    json={"title": "Ordem do fluxo de eventos", "client_id": equipment["client_id"], "equipment_id": equipment["id"]},
+                    headers=self.headers
+                ).json()
+                responses = [
+                    self.client.put(f"/orders/{order['id']}/assign-technician", params={"technician_id": technician_id}, headers=self.headers),
+                    self.client.delete(f"/orders/{order['id']}", headers=self.headers),
+                ]
+                for response in responses:
+                    if response.status_code != 200:
+                        raise AssertionError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text}")
+                events = []
+                while len(events) < 3:
+                    event = await asyncio.wait_for(subscription.queue.get(), 5)
+                    if event["order_id"] == order["id"]:
+                        events.append(event)
+                return events
+            finally:
+                order_event_broker.unsubscribe(subscription)
+
+        try:
+            events = asyncio.run(collect())
+        except asyncio.TimeoutError:
+            print_error("Eventos de ordem não chegaram ao assinante")
+            return False
+        except AssertionError as e:
+            print_error(f"Requisição falhou: {e}")
+            return False
+        finally:
+            self.client.delete(f"/users/{technician_id}", headers=self.headers)
+        types = [event["type"] for event in events]
+        if types != ["created", "assigned", "deleted"] or events[1]["user_id"] != technician_id:
+            print_error(f"Eventos recebidos: {types}")
+            return False
+        print_success(f"Fluxo de eventos entregou {', '.join(types)}")
+        return True
+
+    def test_delta_sync(self) -> bool:
+        """Sincronização incremental devolve só o que mudou desde o token, incluindo exclusões"""
+        print_info("Testando sincronização incremental...")
+        full = self.client.get("/orders/sync/", headers=self.headers).json()
+        equipment = self.client.get("/orders/equipments/", headers=self.headers).json()[0]
+        item_id = self.client.get("/orders/checklists/", headers=self.headers).json()[0]["items"][0]["id"]
+        new_order = {"title": "Ordem da sincronização", "client_id": equipment["client_id"], "equipment_id": equipment["id"]}
+
+        kept = self.client.post("/orders/", json=new_order, headers=self.headers).json()
+        self.client.post(
+            f"/orders/{kept['id']}/checklist-responses/",
+            json=[{"service_order_id": kept["id"], "checklist_item_id": item_id, "is_checked": True}],
+            headers=self.headers
+        )
+        removed = self.client.post("/orders/", json=new_order, headers=self.headers).json()
+        self.client.delete(f"/orders/{removed['id']}", headers=self.headers)
+
+        delta = self.client.get("/orders/sync/", params={"since": full["sync_token"]}, headers=self.headers).json()
+        # Limpeza: respostas antes da ordem (chave estrangeira)
+        self.client.post(f"/orders/{kept['id']}/checklist-responses/", json=[], headers=self.headers)
+        self.client.delete(f"/orders/{kept['id']}", headers=self.headers)
+
+        order_ids = {order["id"] for order in delta["orders"]}
+        tombstones = {(tombstone["entity"], tombstone["id"]) for tombstone in delta["tombstones"]}
+        if kept["id"] not in order_ids or removed["id"] in order_ids:
+            print_error(f"Ordens no delta: {sorted(order_ids)}")
+            return False
+        if not any(response["service_order_id"] == kept["id"] for response in delta["checklist_responses"]):
+            print_error("Resposta de checklist alterada ausente do delta")
+            return False
+        if ("service_order", removed["id"]) not in tombstones:
+            print_error("Exclusão da ordem ausente dos tombstones")
+            return False
+        # Além da ordem nova, só as alteradas na janela de sobreposição antes do token
+        changed_after = decode_sync_token(full["sync_token"]) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        expected_ids = {
+            order["id"] for order in full["orders"]
+            if datetime.fromisoformat(order["updated_at"]) > changed_after
+        } | {kept["id"]}
+        if order_ids != expected_ids:
+            print_error(f"Delta com ordens {sorted(order_ids)}, esperado {sorted(expected_ids)}")
+            return False
+        print_success(
+            f"Sincronização: {len(full['orders'])} ordens no estado completo, "
+            f"{len(delta['orders'])} no delta (+{len(delta['tombstones'])} exclusões)"
+        )
+        return True
+
+    def test_auto_assign_workload(self) -> bool:
+        """Distribuição automática segue a menor carga e a carga acompanha as atribuições"""
+        print_info("Testando atribuição automática por carga de trabalho...")
+        technician = self.client.post(
+            "/users/",
+            json={"username": f"perf_auto_{int(time.time())}", "password": "123456", "role": "tecnico"},
+            headers=self.headers
+        ).json()
+        before = {
+            row["technician_id"]: row["open_orders"]
+            for row in self.client.get("/orders/technicians/workload/", headers=self.headers).json()
+        }
+        equipment = self.client.get("/orders/equipments/", headers=self.headers).json()[0]
+        # Criadas pelo administrador: abertas e sem técnico
+        order_ids = [
+            self.client.post(
+                "/orders/",
+                json={"title": f"Ordem automática {i}", "client_id": equipment["client_id"], "equipment_id": equipment["id"]},
+                headers=self.headers
+            ).json()["id"]
+            for i in range(3)
+        ]
+        try:
+            assigned = self.client.post(
+                "/orders/auto-assign/", json={"order_ids": order_ids}, headers=self.headers
+            ).json()["assignments"]
+            planned = plan_assignments(order_ids, before)
+            if {item["order_id"]: item["technician_id"] for item in assigned} != planned:
+                print_error(f"Atribuições {assigned} diferem do plano por menor carga {planned}")
+                return False
+
+            empty = self.client.post("/orders/auto-assign/", json={"order_ids": []}, headers=self.headers).json()
+            if empty["assignments"]:
+                print_error(f"Lista vazia de ordens atribuiu {empty['assignments']}")
+                return False
+
+            # Carga atualizada logo após o commit; o evento das mesmas atribuições não conta de novo
+            expected = dict(before)
+            for technician_id in planned.values():
+                expected[technician_id] += 1
+            for wait in (0, 1):
+                time.sleep(wait)
+                after = {
+                    row["technician_id"]: row["open_orders"]
+                    for row in self.client.get("/orders/technicians/workload/", headers=self.headers).json()
+                }
+                if after != expected:
+                    print_error(f"Carga após atribuição {after}, esperado {expected}")
+                    return False
+
+            # Atribuição individual sem technician_id: mesma contabilidade imediata
+            order_ids.append(self.client.post(
+                "/orders/",
+                json={"title": "Ordem automática individual", "client_id": equipment["client_id"], "equipment_id": equipment["id"]},
+                headers=self.headers
+            ).json()["id"])
+            response = self.client.put(f"/orders/{order_ids[-1]}/assign-technician", headers=self.headers)
+            if response.status_code != 200:
+                print_error(f"Atribuição individual falhou: {response.status_code} {response.text}")
+                return False
+            chosen = response.json()["order"]["technician"]["id"]
+            least_loaded = min(expected, key=lambda technician_id: (expected[technician_id], technician_id))
+            expected[chosen] += 1
+            after = {
+                row["technician_id"]: row["open_orders"]
+                for row in self.client.get("/orders/technicians/workload/", headers=self.headers).json()
+            }
+            if chosen != least_loaded or after != expected:
+                print_error(f"Atribuição individual escolheu {chosen} (esperado {least_loaded}); carga {after}, esperado {expected}")
+                return False
+        finally:
+            for order_id in order_ids:
+                self.client.delete(f"/orders/{order_id}", headers=self.headers)
+            self.client.delete(f"/users/{technician['id']}", headers=self.headers)
+        print_success(f"{len(order_ids)} ordens distribuídas por menor carga entre {len(before)} técnicos")
+        return True
+
+    def run_all_tests(self) -> bool:
+        """Executa todos os testes"""
+        print("\n" + "="*60)
+        print("TESTES DE DESEMPENHO DO BACKEND")
+        print("="*60 + "\n")
+
+        if not self.login():
+            print_error("Não foi possível fazer login. Abortando testes.")
+            return False
+
+        if not self.ensure_orders():
+            print_warning("Não foi possível preparar os dados de teste.")
+            return False
+
+        tests = [
+            self.test_list_orders_query_count,
+            self.test_cursor_pagination,
+            self.test_one_connection_per_request,
+            self.test_hot_queries_use_indexes,
+            self.test_photo_deduplication,
+            self.test_photo_http_cache,
+            self.test_checklist_save_is_bulk,
+            self.test_checklist_reads_query_count,
+            self.test_reference_cache_etag,
+            self.test_cross_worker_invalidation,
+            self.test_search_orders,
+            self.test_export_orders,
+            self.test_dashboard_counters,
+            self.test_order_conditional_requests,
+            self.test_order_events,
+            self.test_delta_sync,
+            self.test_auto_assign_workload,
+        ]
+        success = all([test() for test in tests])
+
+        print("\n" + "="*60)
+        if success:
+            print_success("TODOS OS TESTES PASSARAM!")
+        else:
+            print_error("ALGUNS TESTES FALHARAM")
+        print("="*60 + "\n")
+        return success
+
+if __name__ == "__main__":
+    tester = PerformanceTester()
+    success = tester.run_all_tests()
+    sys.exit(0 if success else 1)